@@ -3,6 +3,7 @@ import streamlit as st
 import client
 import pdf_handler
 import graph
+import library
 from client import model
 from database import database_manager
 import os
@@ -17,6 +18,33 @@ def ask_question_on_notes(question, notes_text):
     )
     return response.text
 
+INGESTION_POLL_SECONDS = 2
+
+def show_ingestion_status(project_id):
+    """Progress of queued and running ingestion jobs; only polls while some are active"""
+    # both calls are memoized until a job changes, so idle reruns never reach the database
+    if database_manager.has_active_ingestion_jobs(project_id):
+        st.fragment(poll_ingestion_status, run_every=INGESTION_POLL_SECONDS)(project_id)
+    else:
+        render_ingestion_jobs(database_manager.get_ingestion_jobs(project_id))
+
+def poll_ingestion_status(project_id):
+    """Refreshed without rerunning the page while jobs are active"""
+    render_ingestion_jobs(database_manager.get_ingestion_jobs(project_id))
+    if not database_manager.has_active_ingestion_jobs(project_id):
+        # one full rerun stops the polling and picks up the newly indexed documents
+        st.rerun()
+
+def render_ingestion_jobs(jobs):
+    for job_id, file_name, status, pages_done, page_count, chunks_done, error in jobs:
+        if status == 'failed':
+            st.error(f"❌ {file_name}: {error}")
+        elif status == 'queued':
+            st.info(f"⏳ {file_name}: waiting in queue")
+        else:
+            label = f"⚙️ {file_name}: page {pages_done}/{page_count or '?'}, {chunks_done} chunks"
+            st.progress(pages_done / page_count if page_count else 0.0, text=label)
+
 def main_app():
     # Session state initialization
     session_defaults = {
@@ -100,19 +128,21 @@ def main_app():
             uploaded_file = st.file_uploader("Upload PDF", type=["pdf"])
 
             if uploaded_file:
-                os.makedirs(project_path, exist_ok=True)
-                save_path = os.path.join(project_path, "documents", uploaded_file.name)
-
-                doc_id = database_manager.insert_document(project_id, uploaded_file.name, uploaded_file.name)
-
-                if doc_id is not None:
-                    with open(save_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    st.session_state.uploaded_pdfs[uploaded_file.name] = doc_id
-                    database_manager.parse_insert_document(project_id, doc_id)
+                # the uploader keeps its file across reruns; only ingest each upload once
+                ingested = st.session_state.setdefault('ingested_uploads', set())
+                if uploaded_file.file_id not in ingested:
+                    ingested.add(uploaded_file.file_id)
+                    # streamed to disk in blocks and hashed on the way; parsing runs on the background worker
+                    doc_id = database_manager.ingest_upload(project_id, project_path, uploaded_file.name, uploaded_file)
+                    if doc_id is not None:
+                        st.session_state.uploaded_pdfs[uploaded_file.name] = doc_id
+                    else:
+                        st.info(f"{uploaded_file.name} is already in this project.")
             else:
                 st.warning("No file uploaded yet.")
 
+            show_ingestion_status(project_id)
+
             selected_pdf = st.selectbox(
                 "Select PDF",
                 list(st.session_state.uploaded_pdfs.keys()),
@@ -123,9 +153,11 @@ def main_app():
             if st.session_state.selected_pdf:
                 pdf_path = os.path.join(project_path, "documents", selected_pdf)
 
-                with st.expander("📄 PDF Preview", expanded=False):
+                # a toggle rather than an expander: collapsed expanders still run (and render) their contents
+                if st.toggle("📄 PDF Preview", key="pdf_preview_toggle"):
                     try:
-                        pdf_handler.display_pdf_preview(pdf_path)
+                        doc_hash = database_manager.get_document_hash(st.session_state.uploaded_pdfs[selected_pdf])
+                        pdf_handler.display_pdf_preview(pdf_path, doc_hash=doc_hash)
                     except Exception as e:
                         st.error(f"Failed to display PDF: {str(e)}")
 
@@ -165,15 +197,17 @@ def main_app():
         else:
             project_id, project_name, project_path, _ = st.session_state.selected_project
             question = st.text_input("Your question:")
+            regenerate = st.button("🔄 Regenerate answer")
             if question:
-                with st.spinner("Analyzing content..."):
-                    try:
+                try:
+                    with st.spinner("Analyzing content..."):
                         context, chunks = database_manager.get_RAG_question_context(question, project_id)
-                        print(context)
-                        response = client.generate_answer(context)
-                        st.info(f"**Answer:** {response}")
-                    except Exception as e:
-                        st.error(f"Failed to generate answer: {str(e)}")
+                    print(context)
+                    st.markdown("**Answer:**")
+                    # tokens are rendered as they arrive instead of after the whole generation
+                    st.write_stream(client.stream_answer(context, project_id=project_id, regenerate=regenerate))
+                except Exception as e:
+                    st.error(f"Failed to generate answer: {str(e)}")
 
     with tab3:  # Mind Map
         st.header("🧠 Interactive Mind Map")
@@ -182,27 +216,52 @@ def main_app():
         else:
             project_id, project_name, project_path, _ = st.session_state.selected_project
             topic = st.text_input("On what topic do you want to build a mind map?")
-            if topic:
-                with st.spinner("Analyzing content..."):
-                    try:
-                        context, chunks = database_manager.get_RAG_mind_map_contex(topic, project_id)
-                        print(context)
-                        graph_save_path = os.path.join(project_path, "mindmaps", f"{topic}.json")
-                        os.makedirs(os.path.dirname(graph_save_path), exist_ok=True)
-                        graph.initialize_mindmap(context, graph_save_path)
-                    except Exception as e:
-                        st.error(f"Failed to generate answer: {str(e)}")
+            regenerate = st.button("🔄 Regenerate mind map")
+
+            saved_maps = library.list_artifacts(project_id, project_path, 'mindmap')
+            if saved_maps:
+                with st.expander(f"📚 Saved mind maps ({len(saved_maps)})"):
+                    saved = st.selectbox("Saved mind map", saved_maps, format_func=library.artifact_label, key="saved_mindmap")
+                    if st.button("📂 Open mind map"):
+                        graph.load_mindmap(saved['path'], project_id=project_id)
+                        if saved['stale']:
+                            st.warning("The project's documents changed since this mind map was generated; regenerate it to refresh.")
+
+            # only (re)build when the topic changes or a regeneration is asked for, not on every rerun
+            if topic and (regenerate or st.session_state.get('mindmap_topic') != topic):
+                st.session_state.mindmap_topic = topic
+                saved = None if regenerate else library.find_artifact(project_id, project_path, 'mindmap', topic)
+                if saved is not None and not saved['stale']:
+                    graph.load_mindmap(saved['path'], project_id=project_id)
+                else:
+                    with st.spinner("Analyzing content..."):
+                        try:
+                            context, chunks = database_manager.get_RAG_mind_map_contex(topic, project_id)
+                            print(context)
+                            graph_save_path = os.path.join(project_path, "mindmaps", f"{topic}.json")
+                            os.makedirs(os.path.dirname(graph_save_path), exist_ok=True)
+                            graph.initialize_mindmap(
+                                context, graph_save_path, project_id=project_id, regenerate=regenerate, topic=topic,
+                                source_fingerprint=database_manager.get_project_fingerprint(project_id)
+                            )
+                        except Exception as e:
+                            st.error(f"Failed to generate answer: {str(e)}")
 
         # Display mind map if exists
         if 'mindmap' in st.session_state and st.session_state.mindmap['graph']:
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("🔍 Show Full View"):
-                    st.session_state.mindmap['current_root'] = st.session_state.mindmap['initial_root']
-                    st.rerun()
-            
-            # Draw the interactive mind map
-            graph.draw_interactive_mindmap()
+            renderer = st.radio("Renderer", ["Interactive (browser)", "Static image"], horizontal=True, key="mindmap_renderer")
+            if renderer == "Interactive (browser)":
+                # layout, focusing and node details all happen client-side
+                graph.draw_client_mindmap()
+            else:
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("🔍 Show Full View"):
+                        st.session_state.mindmap['current_root'] = st.session_state.mindmap['initial_root']
+                        st.rerun()
+
+                # Draw the interactive mind map
+                graph.draw_interactive_mindmap()
             
             # Node information
             if st.session_state.mindmap.get('selected_node'):
@@ -229,25 +288,50 @@ def main_app():
                     difficulty = st.selectbox("Level", ["Easy", "Medium", "Hard"])
                 with cols[2]:
                     topic = st.text_input("Topic", "General Knowledge")
+                regenerate = st.checkbox("🔄 Regenerate (ignore cached quiz)")
+
+                saved_quizzes = library.list_artifacts(project_id, project_path, 'quiz')
+                if saved_quizzes:
+                    saved = st.selectbox("📚 Saved quizzes", saved_quizzes, format_func=library.artifact_label, key="saved_quiz")
+                    if st.button("📂 Start saved quiz"):
+                        questions = pdf_handler.load_quiz_questions(saved['path'])
+                        if questions:
+                            st.session_state.quiz_data = {
+                                'questions': questions,
+                                'index': 0,
+                                'score': 0,
+                                'active': True,
+                                'answered': {}
+                            }
+                            st.rerun()
+                        else:
+                            st.error("No valid questions in this quiz")
                 
                 if st.button("✨ Generate New Quiz"):
-                    with st.spinner("Creating quiz..."):
+                    with st.status("Creating quiz...") as status:
                         try:
-                            context, chunks = database_manager.get_RAG_context(topic, project_id, top_k=15)
+                            context, chunks = database_manager.get_RAG_context(
+                                topic, project_id, top_k=15, token_budget=database_manager.QUIZ_CONTEXT_TOKENS
+                            )
                             quiz_json_path = os.path.join(project_path, "quizzes", f"{topic}.json")
                             os.makedirs(os.path.dirname(quiz_json_path), exist_ok=True)
-                            quiz_raw = pdf_handler.generate_quiz_questions(
+                            # questions appear as they are written; parsing waits for the full text
+                            quiz_raw = st.write_stream(pdf_handler.stream_quiz_questions(
                                 context,
                                 num_questions=num_questions,
-                                difficulty=difficulty
-                            )
+                                difficulty=difficulty,
+                                project_id=project_id,
+                                regenerate=regenerate
+                            ))
+                            status.update(label="Quiz ready", state="complete")
                             
                             if not quiz_raw:
                                 st.error("Failed to generate quiz content")
                                 st.stop()
                                 
                             questions = pdf_handler.parse_quiz_questions(quiz_raw,
-                                quiz_json_path=quiz_json_path)
+                                quiz_json_path=quiz_json_path, topic=topic,
+                                source_fingerprint=database_manager.get_project_fingerprint(project_id))
                             
                             if not questions:
                                 st.error("No valid questions parsed")
@@ -0,0 +1,87 @@
+"""Recall@k vs. latency of the IVF index against exact search.
+
+    python -m benchmarks.ann_recall                  # synthetic corpus
+    python -m benchmarks.ann_recall --project-id 1   # vectors of a real project
+"""
+import argparse
+import time
+import numpy as np
+from database.vector_index import VectorIndex
+from database.ann_index import IVFIndex
+
+
+def synthetic_corpus(n, dim, n_topics=1000, spread=3.0, n_subjects=50, seed=0):
+    """Clustered embeddings, roughly how chunks of a course group by topic within broader subjects.
+
+    spread is the within-topic noise relative to the topic offsets; recall drops quickly as it grows,
+    so compare engines at a fixed spread and check the result on a real project.
+    """
+    rng = np.random.default_rng(seed)
+    subjects = rng.normal(size=(n_subjects, dim)).astype(np.float32)
+    topics = subjects[rng.integers(0, n_subjects, n_topics)] + rng.normal(size=(n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + spread * rng.normal(size=(n, dim)).astype(np.float32)
+    return np.arange(n), np.zeros(n, dtype=np.int64), vectors
+
+
+def held_out_queries(chunk_ids, document_ids, vectors, n_queries, seed=1):
+    """Split n_queries rows off the corpus to query with, so no query is a copy of an indexed vector"""
+    n_queries = min(n_queries, len(vectors) // 5)
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    queries, keep = order[:n_queries], np.sort(order[n_queries:])
+    return chunk_ids[keep], document_ids[keep], vectors[keep], vectors[queries]
+
+
+def project_corpus(project_id):
+    from database import database_manager
+    index = database_manager.get_project_index(project_id)
+    return index.chunk_ids, index.document_ids, np.asarray(index.matrix)
+
+
+def timed_search(search, queries):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append({chunk_id for _, chunk_id in search(query)})
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--project-id', type=int)
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--spread', type=float, default=3.0, help="within-topic noise of the synthetic corpus")
+    args = parser.parse_args()
+
+    if args.project_id is not None:
+        corpus = project_corpus(args.project_id)
+    else:
+        corpus = synthetic_corpus(args.chunks + args.queries, args.dim, spread=args.spread)
+    # held-out rows from the same topics: the true neighbours are other chunks, not the query itself
+    chunk_ids, document_ids, vectors, queries = held_out_queries(*corpus, args.queries)
+
+    exact = VectorIndex()
+    exact.add(chunk_ids, document_ids, vectors)
+    start = time.perf_counter()
+    ivf = IVFIndex().build(chunk_ids, document_ids, vectors)
+    build_seconds = time.perf_counter() - start
+
+    truth, exact_ms = timed_search(lambda q: exact.search(q, args.top_k), queries)
+    source = f"project {args.project_id}" if args.project_id is not None else f"synthetic, spread {args.spread}"
+    print(f"{len(vectors)} chunks x {vectors.shape[1]} dims ({source}), {len(queries)} held-out queries, "
+          f"{len(ivf.centroids)} lists, built in {build_seconds:.2f}s")
+    print(f"{'engine':<16}{'recall@' + str(args.top_k):>10}{'mean ms':>10}{'p95 ms':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{exact_ms.mean():>10.2f}{np.percentile(exact_ms, 95):>10.2f}")
+    for n_probe in (1, 2, 4, 8, 16, 32):
+        if n_probe > len(ivf.centroids):
+            break
+        found, ivf_ms = timed_search(lambda q: ivf.search(q, args.top_k, n_probe=n_probe), queries)
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        print(f"{'ivf n_probe=' + str(n_probe):<16}{recall:>10.3f}{ivf_ms.mean():>10.2f}{np.percentile(ivf_ms, 95):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Local stand-in for the Gemini batchEmbedContents endpoint.
+
+Returns deterministic vectors (seeded by the text) and can inject latency,
+rate limiting and dropped embeddings to exercise EmbeddingClient:
+
+    python -m benchmarks.fake_embedding_server --port 8765 --fail-rate 0.2
+
+    client = EmbeddingClient(transport=HTTPTransport("http://127.0.0.1:8765/v1beta"))
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+def fake_vector(text, dim):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).normal(size=dim).astype(np.float32).tolist()
+
+
+def make_handler(dim, latency, fail_rate, drop_rate, stats):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            with stats['lock']:
+                stats['requests'] += 1
+            time.sleep(latency)
+            if random.random() < fail_rate:
+                self.send_response(429)
+                self.send_header('Retry-After', '0.1')
+                self.end_headers()
+                return
+            embeddings = []
+            for request in body['requests']:
+                text = request['content']['parts'][0]['text']
+                # a dropped embedding comes back empty, like a partial batch failure
+                embeddings.append({'values': [] if random.random() < drop_rate else fake_vector(text, dim)})
+            payload = json.dumps({'embeddings': embeddings}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=0, dim=768, latency=0.05, fail_rate=0.0, drop_rate=0.0):
+    """Start the server on a background thread; returns (server, stats)"""
+    stats = {'requests': 0, 'lock': threading.Lock()}
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(dim, latency, fail_rate, drop_rate, stats))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.dim, args.latency, args.fail_rate, args.drop_rate)
+    print(f"Fake embedding server on http://127.0.0.1:{server.server_address[1]}/v1beta")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
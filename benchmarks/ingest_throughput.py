@@ -0,0 +1,73 @@
+"""Chunk ingestion throughput: legacy per-chunk commits vs. the pooled bulk path.
+
+    python -m benchmarks.ingest_throughput --chunks 500
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import numpy as np
+from database import database_manager
+from database.connection_pool import get_pool
+
+
+def make_entries(n, dim, words=1600):
+    rng = np.random.default_rng(0)
+    text = " ".join(["lorem"] * words)
+    return [{'text': text, 'page': i // 2 + 1, 'chunk_index': i, 'vector': rng.normal(size=dim).astype(np.float32)} for i in range(n)]
+
+
+def fresh_database(directory, name):
+    db_path = os.path.join(directory, name)
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(open(os.path.join('database', 'db_setup.sql')).read())
+        conn.execute("INSERT INTO projects (name, path) VALUES ('bench', ?)", (directory,))
+        conn.execute("INSERT INTO documents (project_id, file_name, file_hash) VALUES (1, 'bench.pdf', 'x')")
+    return db_path
+
+
+def legacy_insert(db_path, entries):
+    """What parse_insert_document did before: a fresh connection and a commit per chunk"""
+    for entry in entries:
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('''
+                INSERT INTO text_chunks (document_id, text, page_number, chunk_index, vector)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (1, entry['text'], entry['page'], entry['chunk_index'], entry['vector'].tobytes()))
+            conn.commit()
+
+
+def pooled_single_insert(db_path, entries):
+    database_manager.DB_NAME = db_path
+    for entry in entries:
+        database_manager.insert_text_chunk(1, entry['text'], entry['page'], entry['chunk_index'], entry['vector'], update_index=False)
+
+
+def bulk_insert(db_path, entries):
+    database_manager.DB_NAME = db_path
+    database_manager.insert_text_chunks(1, entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=500)
+    parser.add_argument('--dim', type=int, default=768)
+    args = parser.parse_args()
+    entries = make_entries(args.chunks, args.dim)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'path':<28}{'seconds':>10}{'rows/s':>12}")
+        for name, insert in (('legacy per-chunk commit', legacy_insert),
+                             ('pooled per-chunk (WAL)', pooled_single_insert),
+                             ('bulk executemany (WAL)', bulk_insert)):
+            db_path = fresh_database(directory, name.split()[0] + '.db')
+            start = time.perf_counter()
+            insert(db_path, entries)
+            seconds = time.perf_counter() - start
+            print(f"{name:<28}{seconds:>10.3f}{len(entries) / seconds:>12.0f}")
+        get_pool(database_manager.DB_NAME).close()
+
+
+if __name__ == '__main__':
+    main()
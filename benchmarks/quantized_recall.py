@@ -0,0 +1,46 @@
+"""Recall@k, latency and scanned memory of int8 search with float32 rescoring against exact search.
+
+    python -m benchmarks.quantized_recall                  # synthetic corpus
+    python -m benchmarks.quantized_recall --project-id 1   # vectors of a real project
+"""
+import argparse
+import numpy as np
+from database.vector_index import VectorIndex
+from database.quantized_index import QuantizedIndex, quantize
+from benchmarks.ann_recall import synthetic_corpus, held_out_queries, project_corpus, timed_search
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--project-id', type=int)
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--spread', type=float, default=3.0, help="within-topic noise of the synthetic corpus")
+    args = parser.parse_args()
+
+    if args.project_id is not None:
+        corpus = project_corpus(args.project_id)
+    else:
+        corpus = synthetic_corpus(args.chunks + args.queries, args.dim, spread=args.spread)
+    chunk_ids, document_ids, vectors, queries = held_out_queries(*corpus, args.queries)
+
+    exact = VectorIndex()
+    exact.add(chunk_ids, document_ids, vectors)
+    truth, exact_ms = timed_search(lambda q: exact.search(q, args.top_k), queries)
+    source = f"project {args.project_id}" if args.project_id is not None else f"synthetic, spread {args.spread}"
+    print(f"{len(vectors)} chunks x {vectors.shape[1]} dims ({source}), {len(queries)} held-out queries")
+    print(f"{'engine':<24}{'recall@' + str(args.top_k):>10}{'mean ms':>10}{'p95 ms':>10}{'scan MB':>10}")
+    print(f"{'exact float32':<24}{1.0:>10.3f}{exact_ms.mean():>10.2f}{np.percentile(exact_ms, 95):>10.2f}{exact.matrix.nbytes / 2**20:>10.1f}")
+    quantized = QuantizedIndex(exact.chunk_ids, *quantize(exact.matrix), exact.matrix)
+    # oversample=1 is the int8 ranking alone, without the benefit of rescoring
+    for oversample in (1, 2, 4, 8):
+        found, ms = timed_search(lambda q: quantized.search(q, args.top_k, oversample=oversample), queries)
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        label = f"int8 x{oversample} rescored"
+        print(f"{label:<24}{recall:>10.3f}{ms.mean():>10.2f}{np.percentile(ms, 95):>10.2f}{quantized.nbytes / 2**20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
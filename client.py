@@ -2,21 +2,109 @@ import google.generativeai as genai
 import streamlit as st
 import networkx as nx
 import json
+import threading
+import time
+from collections import deque
+import numpy as np
+from database.llm_cache import llm_cache
 
 
 # Configure API key
 genai.configure(api_key="API_KEY")
 
 # Create model instance
-model = genai.GenerativeModel("gemini-2.0-flash")
+MODEL_NAME = "gemini-2.0-flash"
+model = genai.GenerativeModel(MODEL_NAME)
+
+def generate_text(prompt, project_id=None, regenerate=False):
+    """Generates text for a prompt, reusing a cached response unless regenerate is set.
+
+    Responses tagged with project_id are invalidated when that project's chunks change."""
+    if not regenerate:
+        cached = llm_cache.get(MODEL_NAME, prompt)
+        if cached:  # empty entries may predate the guard below
+            return cached
+    start = time.perf_counter()
+    text = model.generate_content(contents=prompt).text
+    # without streaming the first token arrives with the last one
+    elapsed = time.perf_counter() - start
+    record_latency(elapsed, elapsed, cached=False)
+    if text:
+        llm_cache.put(MODEL_NAME, prompt, text, project_id=project_id)
+    return text
+
+# time-to-first-token / total latency of recent generations, for perceived-latency tracking
+LATENCY_WINDOW = 500
+_latencies = deque(maxlen=LATENCY_WINDOW)
+_latencies_lock = threading.Lock()
+
+def record_latency(time_to_first_token, total_time, cached):
+    with _latencies_lock:
+        _latencies.append((time_to_first_token, total_time, cached))
+    source = "cache" if cached else MODEL_NAME
+    print(f"LLM ({source}): first token after {time_to_first_token * 1000:.0f} ms, done after {total_time * 1000:.0f} ms")
+
+def latency_stats():
+    """Median and p95 time-to-first-token and total time (seconds) over recent model calls"""
+    with _latencies_lock:
+        samples = [sample for sample in _latencies if not sample[2]]
+        cached = len(_latencies) - len(samples)
+    if not samples:
+        return {'calls': 0, 'cached': cached}
+    first, total = np.array([sample[:2] for sample in samples]).T
+    return {
+        'calls': len(samples),
+        'cached': cached,
+        'ttft_p50': float(np.percentile(first, 50)),
+        'ttft_p95': float(np.percentile(first, 95)),
+        'total_p50': float(np.percentile(total, 50)),
+        'total_p95': float(np.percentile(total, 95)),
+    }
+
+def stream_text(prompt, project_id=None, regenerate=False):
+    """Like generate_text, but yields the response piece by piece as the model produces it.
+
+    Made for st.write_stream; the full response is cached once the stream completes."""
+    start = time.perf_counter()
+    if not regenerate:
+        cached = llm_cache.get(MODEL_NAME, prompt)
+        if cached:
+            elapsed = time.perf_counter() - start
+            record_latency(elapsed, elapsed, cached=True)
+            yield cached
+            return
+    parts = []
+    first_token = None
+    for chunk in model.generate_content(contents=prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            continue  # e.g. a final chunk that only carries the finish reason
+        if not text:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        parts.append(text)
+        yield text
+    total = time.perf_counter() - start
+    record_latency(first_token if first_token is not None else total, total, cached=False)
+    if parts:
+        # a stream with no text (e.g. blocked by safety filters) must not be served from the cache for days
+        llm_cache.put(MODEL_NAME, prompt, "".join(parts), project_id=project_id)
+
+def stream_answer(question, project_id=None, regenerate=False):
+    """Streaming variant of generate_answer"""
+    if not question.strip():
+        yield "No question provided."
+        return
+    yield from stream_text(question, project_id=project_id, regenerate=regenerate)
 
-def generate_answer(question):
+def generate_answer(question, project_id=None, regenerate=False):
     """Generates an answer to a question using Google GenAI and returns the answer."""
     if not question.strip():
         return "No question provided."
 
-    # Call generate_text from client.py
-    answer = model.generate_content(contents=question).text
+    answer = generate_text(question, project_id=project_id, regenerate=regenerate)
     return answer
 
 def ask_question_on_notes(question, notes_text):
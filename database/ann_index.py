@@ -0,0 +1,126 @@
+import threading
+import numpy as np
+from database.vector_index import normalize_rows
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index over normalized embeddings.
+
+    Vectors are clustered with spherical k-means; a query only scans the
+    n_probe lists whose centroids are closest to it.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, iterations=15, seed=42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        self.size = 0
+        self.built_size = 0
+        self.centroids = None
+        self._lists = []  # per list: [chunk_ids, document_ids, vectors]
+        self._lock = threading.Lock()
+
+    def build(self, chunk_ids, document_ids, vectors):
+        """Cluster the given rows from scratch"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        document_ids = np.asarray(document_ids, dtype=np.int64)
+        if len(vectors) == 0:
+            with self._lock:
+                self.centroids, self._lists, self.size, self.built_size = None, [], 0, 0
+            return self
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, max(len(vectors), 1))
+        centroids = kmeans(vectors, n_lists, iterations=self.iterations, seed=self.seed)
+        assignments = assign(vectors, centroids)
+        lists = []
+        for list_id in range(len(centroids)):
+            members = assignments == list_id
+            lists.append([chunk_ids[members], document_ids[members], vectors[members]])
+        with self._lock:
+            self.centroids = centroids
+            self._lists = lists
+            self.size = self.built_size = len(vectors)
+        return self
+
+    def add(self, chunk_ids, document_ids, vectors):
+        """Route new rows to their nearest list without re-clustering"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(chunk_ids), -1))
+        if self.centroids is None:
+            return self.build(chunk_ids, document_ids, vectors)
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        document_ids = np.asarray(document_ids, dtype=np.int64)
+        assignments = assign(vectors, self.centroids)
+        with self._lock:
+            for list_id in np.unique(assignments):
+                members = assignments == list_id
+                ids, docs, vecs = self._lists[list_id]
+                self._lists[list_id] = [
+                    np.concatenate([ids, chunk_ids[members]]),
+                    np.concatenate([docs, document_ids[members]]),
+                    np.concatenate([vecs, vectors[members]]),
+                ]
+            self.size += len(vectors)
+        return self
+
+    def remove_document(self, document_id):
+        with self._lock:
+            for list_id, (ids, docs, vecs) in enumerate(self._lists):
+                keep = docs != document_id
+                if not keep.all():
+                    self._lists[list_id] = [ids[keep], docs[keep], vecs[keep]]
+                    self.size -= int((~keep).sum())
+
+    def needs_rebuild(self):
+        """Centroids trained on a much smaller corpus give lopsided lists"""
+        return self.built_size == 0 or self.size > 4 * self.built_size
+
+    def search(self, query_vector, top_k=5, n_probe=None):
+        """Return (similarity, chunk_id) pairs from the n_probe closest lists"""
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if self.centroids is None or norm == 0 or top_k <= 0:
+            return []
+        query = query / norm
+        with self._lock:
+            n_probe = min(n_probe or self.n_probe, len(self.centroids))
+            probes = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+            candidates = [self._lists[list_id] for list_id in probes]
+        ids = np.concatenate([ids for ids, _, _ in candidates])
+        if len(ids) == 0:
+            return []
+        scores = np.concatenate([vecs @ query for _, _, vecs in candidates])
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(ids[i])) for i in top]
+
+
+def kmeans(vectors, n_clusters, iterations=15, seed=42, max_training_points=256):
+    """Spherical k-means on normalized rows; trains on a sample for large inputs"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_clusters * max_training_points)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)] if sample_size < len(vectors) else vectors
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign(sample, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        order = np.argsort(assignments, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+        if empty.any():
+            # re-seed empty clusters with random points instead of leaving dead lists
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign(vectors, centroids, batch_size=4096):
+    """Index of the most similar centroid for every row"""
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        out[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return out
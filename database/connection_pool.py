@@ -0,0 +1,64 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # WAL + NORMAL only fsyncs at checkpoints
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",  # ~20 MB page cache per connection
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+class ConnectionPool:
+    """Small pool of long-lived SQLite connections shared across Streamlit threads"""
+
+    def __init__(self, db_name, size=4):
+        self.db_name = db_name
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _open(self):
+        # a connection is only ever used by the thread that checked it out
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; the block runs as one transaction, committed on success"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            with conn:
+                yield conn
+        finally:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name):
+    """One pool per database file"""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ConnectionPool(db_name)
+        return pool
@@ -0,0 +1,122 @@
+import math
+import re
+from collections import Counter
+
+# rough size of a token for Gemini-style tokenizers; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(\[])')
+_TERM = re.compile(r"\w+")
+
+# words too common to say what a question is about; IDF over a handful of retrieved
+# sentences is too small a sample to discount them on its own
+STOP_WORDS = frozenset("""
+a about an and are as at be by can do does for from how in into is it its of on or
+that the their there these this to was were what when where which who why with
+""".split())
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def sentence_spans(text):
+    """(start, end) character spans of the sentences in text, surrounding whitespace excluded"""
+    spans = []
+    start = 0
+    for boundary in [m.start() for m in _SENTENCE_END.finditer(text)] + [len(text)]:
+        sentence = text[start:boundary]
+        stripped = sentence.strip()
+        if stripped:
+            lead = len(sentence) - len(sentence.lstrip())
+            spans.append((start + lead, start + lead + len(stripped)))
+        start = boundary
+    return spans
+
+
+def split_sentences(text):
+    return [text[start:end] for start, end in sentence_spans(text)]
+
+
+def terms(text):
+    return _TERM.findall(text.casefold())
+
+
+def truncate_to_tokens(text, token_budget):
+    """Cut text to the budget at a sentence boundary (or a word boundary for one huge sentence)"""
+    if estimate_tokens(text) <= token_budget:
+        return text
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > token_budget:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return ' '.join(kept)
+    return text[:token_budget * CHARS_PER_TOKEN].rsplit(' ', 1)[0]
+
+
+def page_prefix(page):
+    return f"[page {page}] " if page is not None else ''
+
+
+def excerpt_overhead(page):
+    """Tokens an excerpt costs beyond its sentences: the page prefix and the blank line before it"""
+    return estimate_tokens(page_prefix(page)) + 1
+
+
+def assemble_context(query, chunks, token_budget=1500):
+    """Pack retrieved chunks into at most token_budget tokens of prompt context.
+
+    chunks are (score, chunk_id, document_id, text, page_number) tuples, best first.
+    Sentences repeated across chunks are kept once, every chunk is trimmed to its
+    sentences that share the most (IDF-weighted) terms with the query (plus their
+    neighbours), and the surviving excerpts are ordered by retrieval score, then page.
+    """
+    query_terms = set(terms(query)) - STOP_WORDS
+    candidates = []  # (relevance, chunk_rank, position, sentence)
+    seen = set()
+    for rank, chunk in enumerate(chunks):
+        for position, sentence in enumerate(split_sentences(chunk[3])):
+            key = ' '.join(terms(sentence))
+            if not key or key in seen:
+                continue  # overlapping chunks repeat sentences
+            seen.add(key)
+            candidates.append([0.0, rank, position, sentence])
+    if not candidates:
+        return ''
+
+    # IDF over the retrieved sentences, so terms that appear everywhere count for little
+    document_frequency = Counter(term for candidate in candidates for term in set(terms(candidate[3])) & query_terms)
+    idf = {term: math.log(1 + len(candidates) / count) for term, count in document_frequency.items()}
+    for candidate in candidates:
+        candidate[0] = sum(idf.get(term, 0.0) for term in set(terms(candidate[3])))
+
+    relevant = {(c[1], c[2]) for c in candidates if c[0] > 0}
+    if relevant:
+        # drop off-topic sentences, but keep the neighbours of relevant ones for coherence
+        candidates = [
+            c for c in candidates
+            if c[0] > 0 or (c[1], c[2] - 1) in relevant or (c[1], c[2] + 1) in relevant
+        ]
+
+    selected = {}
+    used = 0
+    # most relevant sentences first; ties go to the better-ranked chunk and earlier sentences
+    for relevance, rank, position, sentence in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        cost = estimate_tokens(sentence) + 1
+        if rank not in selected:
+            cost += excerpt_overhead(chunks[rank][4])
+        if used + cost > token_budget:
+            continue  # a shorter sentence may still fit
+        selected.setdefault(rank, []).append((position, sentence))
+        used += cost
+
+    excerpts = []
+    for rank in sorted(selected, key=lambda r: (-chunks[r][0], chunks[r][4] if chunks[r][4] is not None else 0)):
+        page = chunks[rank][4]
+        text = ' '.join(sentence for _, sentence in sorted(selected[rank]))
+        excerpts.append(page_prefix(page) + text)
+    return '\n\n'.join(excerpts)
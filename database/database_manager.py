@@ -1,15 +1,113 @@
-import sqlite3
+import copy
+import functools
 import hashlib
 import numpy as np
 from datetime import datetime
+from pathlib import Path
 import os
-from database.pdf_parsing.pdf_parse import PDFParser, retrieve_question_answer
+import re
+import tempfile
+import threading
+import time
+from database.pdf_parsing.pdf_parse import PDFParser, retrieve_question_answer, query_embedding_cache
+from database.vector_index import VectorIndex
+from database.vector_store import MmapVectorStore
+from database.ann_index import IVFIndex
+from database.connection_pool import get_pool
+from database.llm_cache import llm_cache
+from database.context_builder import assemble_context
+from database.pdf_parsing.ocr_cache import OCRCache
+from database.pdf_parsing.embedding_cache import EmbeddingCache
 
 DB_NAME = 'database/projects.db'
-pdf_parser = PDFParser()
+embedding_cache = EmbeddingCache()
+pdf_parser = PDFParser(ocr_cache=OCRCache(), embedding_cache=embedding_cache)
+query_embedding_cache.persistent = embedding_cache
+
+# project_id -> VectorIndex, loaded on first search and kept in sync by insert/delete
+_project_indexes = {}
+_project_indexes_lock = threading.Lock()
+# project_id -> IVFIndex, only built for projects searched with engine="ivf"
+_ann_indexes = {}
+_ann_indexes_lock = threading.Lock()
+# project_id -> (VectorIndex, QuantizedIndex mapped alongside it), only for projects searched with engine="int8"
+_quantized_indexes = {}
+_quantized_indexes_lock = threading.Lock()
+
+# sync_projects_directory runs on every Streamlit rerun; rescan the disk at most this often (seconds)
+SYNC_INTERVAL = 30
+_last_sync = float('-inf')
+_sync_lock = threading.Lock()
+
+SCHEMA_FILE = Path(__file__).with_name('db_setup.sql')
+_schema_ready = set()
 
 def connect():
-    return sqlite3.connect(DB_NAME)
+    """Borrow a pooled connection (WAL mode, tuned pragmas); use as `with connect() as conn:`"""
+    pool = get_pool(DB_NAME)
+    if DB_NAME not in _schema_ready:
+        # db_setup.sql is idempotent, so older databases pick up new tables on first use
+        with pool.connection() as conn:
+            conn.executescript(SCHEMA_FILE.read_text())
+            migrate_schema(conn)
+            backfill_fts_index(conn)
+        _schema_ready.add(DB_NAME)
+    return pool.connection()
+
+# columns added after the first release; CREATE TABLE IF NOT EXISTS leaves older tables as they were
+ADDED_COLUMNS = {
+    'text_chunks': (
+        ('end_page', 'INTEGER'),
+        ('start_char', 'INTEGER'),
+        ('end_char', 'INTEGER'),
+    ),
+}
+
+def migrate_schema(conn):
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns:
+            if name not in existing:
+                print(f"Adding column {table}.{name}")
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+def backfill_fts_index(conn):
+    """Index chunks written before the full-text table existed (the triggers cover everything after)"""
+    indexed = conn.execute("SELECT COUNT(*) FROM text_chunks_fts_docsize").fetchone()[0]
+    chunks = conn.execute("SELECT COUNT(*) FROM text_chunks").fetchone()[0]
+    if indexed != chunks:
+        print(f"Rebuilding full-text index ({indexed} of {chunks} chunks indexed)")
+        conn.execute("INSERT INTO text_chunks_fts (text_chunks_fts) VALUES ('rebuild')")
+
+# -- Metadata cache --
+# Project and document listings are read on every Streamlit rerun but only change through the
+# insert/delete functions below, so they are memoized until one of those bumps the version.
+_metadata_version = 0
+_metadata_cache = {}
+_metadata_lock = threading.Lock()
+
+def cached_metadata(func):
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__name__, args)
+        with _metadata_lock:
+            version = _metadata_version
+            entry = _metadata_cache.get(key)
+        if entry is None or entry[0] != version:
+            entry = (version, func(*args))
+            with _metadata_lock:
+                # a write that landed while we were reading makes this result stale
+                if _metadata_version == version:
+                    _metadata_cache[key] = entry
+        # callers (e.g. session state) may mutate what they get back
+        return copy.copy(entry[1])
+    return wrapper
+
+def invalidate_metadata():
+    global _metadata_version
+    with _metadata_lock:
+        _metadata_version += 1
+        _metadata_cache.clear()
 
 # -- Insert functions --
 
@@ -18,10 +116,12 @@ def insert_project(name, path):
         c = conn.cursor()
         c.execute("INSERT INTO projects (name, path) VALUES (?, ?)", (name, path))
         conn.commit()
-        return c.lastrowid
+        project_id = c.lastrowid
+    invalidate_metadata()
+    return project_id
 
-def insert_document(project_id, file_name, file_content):
-    file_hash = hash_file(file_content)
+def insert_document(project_id, file_name, file_hash):
+    """Register a document by the SHA256 of its bytes; returns None if the project already has identical content"""
     with connect() as conn:
         c = conn.cursor()
         # check if the document already exists
@@ -33,10 +133,12 @@ def insert_document(project_id, file_name, file_content):
             c = conn.cursor()
             c.execute("INSERT INTO documents (project_id, file_name, file_hash) VALUES (?, ?, ?)", (project_id, file_name, file_hash))
             conn.commit()
-            return c.lastrowid
+            document_id = c.lastrowid
+    invalidate_metadata()
+    return document_id
 
-def parse_insert_document(project_id, document_id):
-    ve = None
+def parse_insert_document(project_id, document_id, progress=None):
+    """Parse, embed and store a document; progress(pages_done, page_count, chunks_done) is called along the way"""
     print(f"Parsing document {document_id} for project {project_id}")
     with connect() as conn:
         c = conn.cursor()
@@ -45,18 +147,53 @@ def parse_insert_document(project_id, document_id):
         project_path = c.fetchone()[0]
         c.execute("SELECT file_name FROM documents WHERE id = ?", (document_id,))
         file_name = c.fetchone()[0]
-        file_path = os.path.join(project_path, "documents", file_name)
-        if not os.path.exists(file_path):
-            print(f"File {file_path} does not exist.")
-            return None
-        with open(file_path, 'rb') as file:
-            ve = pdf_parser.parse_pdf(file)
-    print('vector entries: ', ve)
-    if ve is not None:
-        for vector_entry in ve:
-            insert_text_chunk(document_id, vector_entry['text'], vector_entry['page'], vector_entry['chunk_index'], vector_entry['vector'])
-
-def insert_text_chunk(document_id, text, page_number, chunk_index, vector: np.ndarray):
+    file_path = os.path.join(project_path, "documents", file_name)
+    if not os.path.exists(file_path):
+        print(f"File {file_path} does not exist.")
+        return None
+    pages = [0, None]
+    chunks_done = 0
+
+    def on_page(page_number, page_count):
+        pages[:] = [page_number, page_count]
+        if progress is not None:
+            progress(page_number, page_count, chunks_done)
+
+    # PyMuPDF opens the path itself, so the file is never copied into memory;
+    # each embedded batch is committed and indexed right away, so large files become searchable early
+    for batch in pdf_parser.iter_vector_entries(file_path, on_page=on_page):
+        insert_text_chunks(document_id, batch)
+        chunks_done += len(batch)
+        if progress is not None:
+            progress(pages[0], pages[1], chunks_done)
+    return chunks_done
+
+def insert_text_chunks(document_id, vector_entries):
+    """Insert a batch of a document's chunks in a single transaction and index them in one go"""
+    rows = [
+        (
+            document_id, entry['text'], entry['page'], entry.get('end_page', entry['page']),
+            entry.get('start_char'), entry.get('end_char'), entry['chunk_index'],
+            np.asarray(entry['vector'], dtype=np.float32).tobytes()
+        )
+        for entry in vector_entries
+    ]
+    if not rows:
+        return []
+    with connect() as conn:
+        c = conn.cursor()
+        c.executemany('''
+            INSERT INTO text_chunks (document_id, text, page_number, end_page, start_char, end_char, chunk_index, vector)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        # the write lock is held until commit, so the new rowids are contiguous
+        last_id = c.execute("SELECT last_insert_rowid()").fetchone()[0]
+    chunk_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+    print(f"Inserted {len(rows)} text chunks for document {document_id}")
+    index_chunks(document_id, chunk_ids, [entry['vector'] for entry in vector_entries])
+    return chunk_ids
+
+def insert_text_chunk(document_id, text, page_number, chunk_index, vector: np.ndarray, update_index=True):
     vector_blob = vector.astype(np.float32).tobytes()
     print(f"Inserting text chunk for document {document_id}: {text[:30]}... (Page {page_number}, Index {chunk_index})")
     with connect() as conn:
@@ -66,21 +203,86 @@ def insert_text_chunk(document_id, text, page_number, chunk_index, vector: np.nd
             VALUES (?, ?, ?, ?, ?)
         ''', (document_id, text, page_number, chunk_index, vector_blob))
         conn.commit()
-        return c.lastrowid
+        chunk_id = c.lastrowid
+    if update_index:
+        index_chunks(document_id, [chunk_id], [vector])
+    return chunk_id
+
+def index_chunks(document_id, chunk_ids, vectors):
+    """Add freshly inserted chunks to the project's on-disk store and in-memory index"""
+    if not chunk_ids:
+        return
+    project = get_document_project(document_id)
+    if project is None:
+        return
+    project_id, project_path = project
+    llm_cache.invalidate_project(project_id)
+    _quantized_indexes.pop(project_id, None)
+    ann_index = _ann_indexes.get(project_id)
+    if ann_index is not None:
+        ann_index.add(chunk_ids, [document_id] * len(chunk_ids), np.stack(vectors))
+    store = get_vector_store(project_path)
+    # under the lock get_project_index loads with, so a load in flight never caches a snapshot from before this write
+    with _project_indexes_lock:
+        if store is not None and store.exists():
+            store.append(chunk_ids, [document_id] * len(chunk_ids), np.stack(vectors))
+            # remapping the grown file is cheap; the next search picks it up
+            _project_indexes.pop(project_id, None)
+        else:
+            index = _project_indexes.get(project_id)
+            if index is not None:
+                # an index loaded after the insert committed already holds these rows
+                new = ~np.isin(chunk_ids, index.chunk_ids)
+                if new.any():
+                    index.add(np.asarray(chunk_ids)[new], [document_id] * int(new.sum()), np.stack(vectors)[new])
 
 # -- Helper functions --
 
-def hash_file(file_content: str):
+def hash_path(path, block_size=1 << 20):
+    """SHA256 of a file's bytes, read in fixed-size blocks"""
     hasher = hashlib.sha256()
-    hasher.update(file_content.encode('utf-8'))
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
     return hasher.hexdigest()
 
+@cached_metadata
+def get_document_project(document_id):
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT p.id, p.path
+            FROM documents d
+            JOIN projects p ON d.project_id = p.id
+            WHERE d.id = ?
+        """, (document_id,))
+        return c.fetchone()
+
+def get_vector_store(project_path):
+    """Return the memory-mapped vector store under projects/<name>/index, if the project directory exists"""
+    if not project_path or not os.path.isdir(project_path):
+        return None
+    return MmapVectorStore(os.path.join(project_path, "index"))
+
+@cached_metadata
 def get_all_projects():
     with connect() as conn:
         c = conn.cursor()
         c.execute("SELECT id, name, path, created_at FROM projects")
         return c.fetchall()
 
+@cached_metadata
+def get_project_fingerprint(project_id):
+    """Hash of the project's documents and their contents; changes whenever one is added, edited or removed"""
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, file_hash FROM documents WHERE project_id = ? ORDER BY id", (project_id,))
+        hasher = hashlib.sha256()
+        for doc_id, file_hash in c.fetchall():
+            hasher.update(f"{doc_id}:{file_hash}\n".encode('utf-8'))
+        return hasher.hexdigest()
+
+@cached_metadata
 def get_all_documents(project_id):
     with connect() as conn:
         c = conn.cursor()
@@ -89,81 +291,569 @@ def get_all_documents(project_id):
         return {file_name: doc_id for doc_id, file_name in c.fetchall()}
 
 def delete_document(document_id):
+    project = get_document_project(document_id)
     with connect() as conn:
         c = conn.cursor()
+        # explicit, so databases opened without foreign keys enabled never keep orphaned chunks
+        c.execute("DELETE FROM text_chunks WHERE document_id = ?", (document_id,))
+        c.execute("DELETE FROM file_manifest WHERE document_id = ?", (document_id,))
+        c.execute("DELETE FROM ingestion_jobs WHERE document_id = ?", (document_id,))
         c.execute("DELETE FROM documents WHERE id = ?", (document_id,))
         conn.commit()
+    invalidate_metadata()
+    invalidate_ingestion_jobs()
+    if project is not None:
+        unindex_document(project, document_id)
+
+def delete_document_chunks(document_id):
+    """Drop a document's chunks but keep the document, e.g. before re-parsing it"""
+    project = get_document_project(document_id)
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM text_chunks WHERE document_id = ?", (document_id,))
+        deleted = c.rowcount
+    if project is not None and deleted:
+        unindex_document(project, document_id)
+
+def unindex_document(project, document_id):
+    project_id, project_path = project
+    llm_cache.invalidate_project(project_id)
+    _quantized_indexes.pop(project_id, None)
+    ann_index = _ann_indexes.get(project_id)
+    if ann_index is not None:
+        ann_index.remove_document(document_id)
+    store = get_vector_store(project_path)
+    with _project_indexes_lock:
+        if store is not None and store.exists():
+            store.remove_document(document_id)
+            _project_indexes.pop(project_id, None)
+        else:
+            index = _project_indexes.get(project_id)
+            if index is not None:
+                index.remove_document(document_id)
+
+# prompt context budgets (estimated tokens); prompt size and LLM latency follow these, not chunk size
+QUESTION_CONTEXT_TOKENS = 1500
+MIND_MAP_CONTEXT_TOKENS = 1500
+MIND_MAP_BRANCH_CONTEXT_TOKENS = 800
+QUIZ_CONTEXT_TOKENS = 2500
 
-def get_RAG_context(statement, project_id, top_k=5):
-    statement_vector = retrieve_question_answer(statement)
-    chunks = search_similar_chunks(statement_vector, project_id, top_k=top_k)
-    context = ' '.join([chunk[3] for chunk in chunks])
+def get_RAG_context(statement, project_id, top_k=5, engine="exact", retrieval="auto", token_budget=None):
+    """retrieval: "vector", "lexical" (BM25 only, no embedding call), "hybrid" (both, fused with RRF)
+    or "auto" (lexical for short keyword lookups with enough chunks containing every term, hybrid otherwise).
+
+    With a token_budget the chunks are deduped, trimmed to their most relevant sentences and packed
+    to fit; without one they are concatenated whole."""
+    chunks = retrieve_chunks(statement, project_id, top_k=top_k, engine=engine, retrieval=retrieval)
+    if token_budget is not None:
+        context = assemble_context(statement, chunks, token_budget=token_budget)
+    else:
+        context = ' '.join([chunk[3] for chunk in chunks])
     return context, chunks
 
+def retrieve_chunks(statement, project_id, top_k=5, engine="exact", retrieval="auto"):
+    if retrieval == "auto":
+        if is_keyword_query(statement):
+            # an OR match is filled by any chunk sharing one common word; only skip the embedding when
+            # top_k chunks contain every term of the lookup
+            chunks = lexical_search(statement, project_id, top_k=top_k, match_all=True)
+            if len(chunks) >= top_k:
+                return chunks
+        retrieval = "hybrid"
+    if retrieval == "lexical":
+        return lexical_search(statement, project_id, top_k=top_k)
+    if retrieval == "vector":
+        return search_similar_chunks(retrieve_question_answer(statement), project_id, top_k=top_k, engine=engine)
+    if retrieval == "hybrid":
+        return hybrid_search(statement, project_id, top_k=top_k, engine=engine)
+    raise ValueError(f"Unknown retrieval mode: {retrieval}")
+
 def get_RAG_question_context(question, project_id):
-    basic_context, chunks = get_RAG_context(question, project_id)
+    basic_context, chunks = get_RAG_context(question, project_id, top_k=8, token_budget=QUESTION_CONTEXT_TOKENS)
     context = f"""Based on this context: {basic_context}
      Answer the question: {question}
      If the answer is not in the context, say "There is no information about this topic in the documents"."""
     return context, chunks
 
 def get_RAG_mind_map_contex(topic, project_id):
-    basic_context, chunks = get_RAG_context(topic, project_id)
+    basic_context, chunks = get_RAG_context(topic, project_id, top_k=8, token_budget=MIND_MAP_CONTEXT_TOKENS)
     context = f"""Based on this context: {basic_context}
      Create a mind map based on the topic of {topic}."""
     return context, chunks
 
+def get_RAG_mind_map_branch_context(topic, node_label, project_id, top_k=4):
+    """Context for expanding one mind map node, retrieved for that node rather than the whole topic"""
+    basic_context, chunks = get_RAG_context(
+        f"{node_label} ({topic})", project_id, top_k=top_k, token_budget=MIND_MAP_BRANCH_CONTEXT_TOKENS
+    )
+    context = f"""Based on this context: {basic_context}
+     Expand the mind map on {topic} below the node "{node_label}"."""
+    return context, chunks
+
+
+def get_project_index(project_id):
+    """Return the in-memory vector index for a project, building it from text_chunks on first use"""
+    index = _project_indexes.get(project_id)
+    if index is not None:
+        return index
+    with _project_indexes_lock:
+        index = _project_indexes.get(project_id)
+        if index is None:
+            index = load_project_index(project_id)
+            _project_indexes[project_id] = index
+        return index
+
+def load_project_index(project_id):
+    """Map the project's on-disk vector store, rebuilding it from text_chunks when it is missing or stale"""
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("SELECT path FROM projects WHERE id = ?", (project_id,))
+        row = c.fetchone()
+        c.execute("""
+            SELECT COUNT(*), MAX(tc.id)
+            FROM text_chunks tc
+            JOIN documents d ON tc.document_id = d.id
+            WHERE d.project_id = ?
+        """, (project_id,))
+        count, max_id = c.fetchone()
+
+    store = get_vector_store(row[0]) if row else None
+    if store is not None:
+        index = store.load()
+        if index is not None and index.size == count and (count == 0 or int(index.chunk_ids.max()) == max_id):
+            return index
+        index = None  # drop the stale mapping before the files are rewritten
+
+    chunk_ids, document_ids, vectors = read_project_vectors(project_id)
+    if store is not None and chunk_ids:
+        try:
+            store.rebuild(chunk_ids, document_ids, vectors)
+            return store.load()
+        except OSError as e:
+            print(f"Could not write vector store for project {project_id}: {e}")
 
-def search_similar_chunks(query_vector: np.ndarray, project_id: int, top_k=5):
+    index = VectorIndex(capacity=max(len(chunk_ids), 64))
+    if chunk_ids:
+        index.add(chunk_ids, document_ids, vectors)
+    return index
+
+def read_project_vectors(project_id):
+    """Read every chunk vector of a project from text_chunks as one (n, dim) float32 matrix"""
     with connect() as conn:
         c = conn.cursor()
         c.execute("""
-            SELECT tc.id, tc.document_id, tc.text, tc.vector, tc.page_number
+            SELECT tc.id, tc.document_id, tc.vector
             FROM text_chunks tc
             JOIN documents d ON tc.document_id = d.id
             WHERE d.project_id = ?
+            ORDER BY tc.id
         """, (project_id,))
-        results = []
-        for chunk_id, doc_id, text, vec_blob, page_number in c.fetchall():
-            vec = np.frombuffer(vec_blob, dtype=np.float32)
-            sim = cosine_similarity(query_vector, vec)
+        rows = c.fetchall()
+    if not rows:
+        return [], [], None
+    chunk_ids, document_ids, blobs = zip(*rows)
+    vectors = np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(len(rows), -1)
+    return list(chunk_ids), list(document_ids), vectors
+
+def get_ann_index(project_id):
+    """Return the project's IVF index, (re)clustering it when missing or outgrown"""
+    ann_index = _ann_indexes.get(project_id)
+    if ann_index is not None and not ann_index.needs_rebuild():
+        return ann_index
+    with _ann_indexes_lock:
+        ann_index = _ann_indexes.get(project_id)
+        if ann_index is None or ann_index.needs_rebuild():
+            index = get_project_index(project_id)
+            ann_index = IVFIndex().build(index.chunk_ids, index.document_ids, index.matrix)
+            _ann_indexes[project_id] = ann_index
+        return ann_index
+
+def get_quantized_index(project_id):
+    """Return the project's memory-mapped int8 index, or None when the project has no on-disk vector store"""
+    index = get_project_index(project_id)
+    cached = _quantized_indexes.get(project_id)
+    if cached is not None and cached[0] is index:
+        return cached[1]
+    with _quantized_indexes_lock:
+        cached = _quantized_indexes.get(project_id)
+        if cached is None or cached[0] is not index:
+            with connect() as conn:
+                row = conn.execute("SELECT path FROM projects WHERE id = ?", (project_id,)).fetchone()
+            store = get_vector_store(row[0]) if row else None
+            quantized = store.load_quantized(index) if store is not None and store.exists() else None
+            cached = _quantized_indexes[project_id] = (index, quantized)
+        return cached[1]
+
+def search_similar_chunks(query_vector: np.ndarray, project_id: int, top_k=5, engine="exact"):
+    """engine="exact" scans every chunk, engine="ivf" only the closest IVF lists,
+    engine="int8" scans the int8 rows of the vector store and rescores the best candidates in float32"""
+    if engine == "ivf":
+        hits = get_ann_index(project_id).search(query_vector, top_k=top_k)
+    elif engine == "int8":
+        # without an up-to-date on-disk store there are no int8 rows to scan; search the float32 index exactly
+        index = get_quantized_index(project_id) or get_project_index(project_id)
+        hits = index.search(query_vector, top_k=top_k)
+    elif engine == "exact":
+        hits = get_project_index(project_id).search(query_vector, top_k=top_k)
+    else:
+        raise ValueError(f"Unknown search engine: {engine}")
+    if not hits:
+        return []
+    chunk_ids = [chunk_id for _, chunk_id in hits]
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT id, document_id, text, page_number
+            FROM text_chunks
+            WHERE id IN ({','.join('?' * len(chunk_ids))})
+        """, chunk_ids)
+        rows = {chunk_id: (doc_id, text, page_number) for chunk_id, doc_id, text, page_number in c.fetchall()}
+    results = []
+    for sim, chunk_id in hits:
+        if chunk_id in rows:
+            doc_id, text, page_number = rows[chunk_id]
             results.append((sim, chunk_id, doc_id, text, page_number))
-        results.sort(reverse=True)
-        return results[:top_k]
-
-def cosine_similarity(vec1, vec2):
-    if np.linalg.norm(vec1) == 0 or np.linalg.norm(vec2) == 0:
-        return 0.0
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-
-def sync_projects_directory():
-    base_dir = os.path.join(os.getcwd(), 'projects')
-    existing_projects = {name: (pid, path) for pid, name, path, _ in get_all_projects()}
-
-    for project_name in os.listdir(base_dir):
-        project_path = os.path.join(base_dir, project_name)
-        if not os.path.isdir(project_path):
-            continue  # Skip non-directories
-
-        # Insert project if not already in DB
-        if project_name not in existing_projects:
-            project_id = insert_project(project_name, project_path)
-        else:
-            project_id = existing_projects[project_name][0]
+    return results
+
+KEYWORD_QUERY_MAX_TERMS = 4
+QUESTION_WORDS = {'what', 'why', 'how', 'when', 'where', 'who', 'which', 'explain', 'describe', 'compare'}
+RRF_K = 60
+
+def query_terms(statement):
+    return re.findall(r"\w+", statement.casefold())
+
+def is_keyword_query(statement):
+    """Short lookups such as a formula name or a chapter heading, as opposed to questions"""
+    terms = query_terms(statement)
+    return 0 < len(terms) <= KEYWORD_QUERY_MAX_TERMS and '?' not in statement and not QUESTION_WORDS & set(terms)
+
+def lexical_search(statement, project_id, top_k=5, match_all=False):
+    """BM25 search over the project's chunks; same result shape as search_similar_chunks, higher is better.
 
-        # Get already stored documents for this project
-        existing_docs = get_all_documents(project_id)
+    match_all only returns chunks containing every term instead of any of them."""
+    terms = query_terms(statement)
+    if not terms:
+        return []
+    # quote every term so user input is never parsed as FTS5 query syntax
+    match = (' AND ' if match_all else ' OR ').join('"' + term.replace('"', '""') + '"' for term in dict.fromkeys(terms))
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT bm25(text_chunks_fts) AS score, t.id, t.document_id, t.text, t.page_number
+            FROM text_chunks_fts
+            JOIN text_chunks t ON t.id = text_chunks_fts.rowid
+            JOIN documents d ON d.id = t.document_id
+            WHERE text_chunks_fts MATCH ? AND d.project_id = ?
+            ORDER BY score
+            LIMIT ?
+        """, (match, project_id, top_k))
+        # bm25() is lower-is-better
+        return [(-score, chunk_id, doc_id, text, page_number) for score, chunk_id, doc_id, text, page_number in c.fetchall()]
+
+def hybrid_search(statement, project_id, top_k=5, engine="exact", candidates=None):
+    """Fuse BM25 and cosine rankings with reciprocal rank fusion; scores are RRF sums"""
+    candidates = candidates or top_k * 4
+    rankings = [
+        lexical_search(statement, project_id, top_k=candidates),
+        search_similar_chunks(retrieve_question_answer(statement), project_id, top_k=candidates, engine=engine),
+    ]
+    fused = {}
+    rows = {}
+    for ranking in rankings:
+        for rank, (_, chunk_id, doc_id, text, page_number) in enumerate(ranking):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            rows[chunk_id] = (doc_id, text, page_number)
+    best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [(fused[chunk_id], chunk_id, *rows[chunk_id]) for chunk_id in best]
+
+def sync_projects_directory(force=False):
+    """Register new PDFs under projects/ and queue new or changed ones for ingestion.
+
+    Rate limited to once per SYNC_INTERVAL seconds; files whose size and mtime
+    match the manifest are skipped without being read.
+    """
+    global _last_sync
+    with _sync_lock:
+        if not force and time.monotonic() - _last_sync < SYNC_INTERVAL:
+            return
+        _last_sync = time.monotonic()
+        base_dir = os.path.join(os.getcwd(), 'projects')
+        if not os.path.isdir(base_dir):
+            return
+        existing_projects = {name: pid for pid, name, path, _ in get_all_projects()}
+
+        with os.scandir(base_dir) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue  # Skip non-directories
+                project_id = existing_projects.get(entry.name)
+                if project_id is None:
+                    project_id = insert_project(entry.name, entry.path)
+                sync_project_documents(project_id, os.path.join(entry.path, "documents"))
+
+def sync_project_documents(project_id, documents_dir):
+    if not os.path.isdir(documents_dir):
+        return
+    manifest = get_file_manifest(project_id)
+    existing_docs = None
+    seen = set()
 
-        for file_name in os.listdir(os.path.join(project_path, "documents")):
-            if not file_name.lower().endswith(".pdf"):
+    with os.scandir(documents_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(".pdf"):
                 continue  # Only process PDF files
+            seen.add(entry.name)
+            stat = entry.stat()
+            known = manifest.get(entry.name)
+            if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue  # untouched since the last scan
 
-            if file_name in existing_docs:
-                continue  # Already tracked in DB
+            content_hash = hash_path(entry.path)
+            if known is not None and known[2] == content_hash:
+                # touched but byte-identical; just remember the new mtime
+                update_file_manifest(project_id, entry.name, stat, content_hash, known[3])
+                continue
 
-            doc_id = insert_document(project_id, file_name, file_name)
+            if known is not None and known[3] is not None:
+                # edited in place: re-index the existing document
+                print(f"Document {entry.name} changed on disk, re-indexing")
+                set_document_hash(known[3], content_hash)
+                update_file_manifest(project_id, entry.name, stat, content_hash, known[3])
+                enqueue_ingestion(project_id, known[3])
+                continue
+
+            if existing_docs is None:
+                existing_docs = get_all_documents(project_id)
+            doc_id = existing_docs.get(entry.name)
+            if doc_id is not None:
+                # tracked before the manifest existed (or uploaded through the UI); adopt without re-parsing
+                if get_document_hash(doc_id) != content_hash:
+                    # older rows hold the hash of the file name rather than of its bytes
+                    set_document_hash(doc_id, content_hash)
+                update_file_manifest(project_id, entry.name, stat, content_hash, doc_id)
+                continue
+
+            doc_id = insert_document(project_id, entry.name, content_hash)
+            update_file_manifest(project_id, entry.name, stat, content_hash, doc_id)
             if doc_id:
-                parse_insert_document(project_id, doc_id)
+                schedule_ingestion(project_id, doc_id, content_hash)
+
+    gone = [name for name in manifest if name not in seen]
+    if gone:
+        with connect() as conn:
+            conn.executemany("DELETE FROM file_manifest WHERE project_id = ? AND file_name = ?",
+                             [(project_id, name) for name in gone])
+
+def ingest_upload(project_id, project_path, file_name, stream, block_size=1 << 20):
+    """Stream an uploaded file into the project's documents folder, hashing it on the way.
+
+    Returns the document id, or None if the project already holds a byte-identical file.
+    """
+    documents_dir = os.path.join(project_path, "documents")
+    os.makedirs(documents_dir, exist_ok=True)
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=documents_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for block in iter(lambda: stream.read(block_size), b''):
+                hasher.update(block)
+                f.write(block)
+        file_hash = hasher.hexdigest()
+
+        doc_id = get_all_documents(project_id).get(file_name)
+        if doc_id is None:
+            doc_id = insert_document(project_id, file_name, file_hash)
+            if doc_id is None:
+                return None
+            replaced = False
+        else:
+            if get_document_hash(doc_id) != file_hash and is_same_file(project_id, documents_dir, file_name, file_hash):
+                # a row from before content hashing, not yet adopted by a directory scan
+                set_document_hash(doc_id, file_hash)
+                update_file_manifest(project_id, file_name, os.stat(os.path.join(documents_dir, file_name)), file_hash, doc_id)
+            if get_document_hash(doc_id) == file_hash:
+                print(f"Document {file_name} is unchanged in project {project_id}.")
+                return None
+            # same name, new content: re-index the existing document
+            set_document_hash(doc_id, file_hash)
+            replaced = True
+
+        save_path = os.path.join(documents_dir, file_name)
+        os.replace(tmp_path, save_path)
+        update_file_manifest(project_id, file_name, os.stat(save_path), file_hash, doc_id)
+        if replaced:
+            enqueue_ingestion(project_id, doc_id)
+        else:
+            schedule_ingestion(project_id, doc_id, file_hash)
+        return doc_id
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def is_same_file(project_id, documents_dir, file_name, file_hash):
+    """Whether the copy already in the documents folder has these bytes, using the manifest when it knows the file"""
+    known = get_file_manifest(project_id).get(file_name)
+    if known is not None:
+        return known[2] == file_hash
+    path = os.path.join(documents_dir, file_name)
+    return os.path.isfile(path) and hash_path(path) == file_hash
+
+def schedule_ingestion(project_id, document_id, file_hash):
+    """Queue a new document, or copy the chunks of an already parsed byte-identical one"""
+    source_id = find_parsed_duplicate(file_hash, document_id)
+    if source_id is None:
+        enqueue_ingestion(project_id, document_id)
+        return
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT text, page_number, end_page, start_char, end_char, chunk_index, vector FROM text_chunks
+            WHERE document_id = ? ORDER BY id
+        """, (source_id,))
+        entries = [
+            {
+                'text': text, 'page': page, 'end_page': end_page, 'start_char': start_char, 'end_char': end_char,
+                'chunk_index': chunk_index, 'vector': np.frombuffer(blob, dtype=np.float32)
+            }
+            for text, page, end_page, start_char, end_char, chunk_index, blob in c.fetchall()
+        ]
+    print(f"Document {document_id} is identical to document {source_id}; copying {len(entries)} chunks instead of parsing")
+    insert_text_chunks(document_id, entries)
+
+def find_parsed_duplicate(file_hash, document_id):
+    """Id of another fully ingested document with the same bytes, in any project"""
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT d.id FROM documents d
+            WHERE d.file_hash = ? AND d.id != ?
+              AND EXISTS (SELECT 1 FROM text_chunks t WHERE t.document_id = d.id)
+              AND NOT EXISTS (
+                  SELECT 1 FROM ingestion_jobs j
+                  WHERE j.document_id = d.id AND j.status IN ('queued', 'running', 'failed')
+              )
+            LIMIT 1
+        """, (file_hash, document_id))
+        row = c.fetchone()
+        return row[0] if row else None
+
+@cached_metadata
+def get_document_hash(document_id):
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("SELECT file_hash FROM documents WHERE id = ?", (document_id,))
+        row = c.fetchone()
+        return row[0] if row else None
+
+def set_document_hash(document_id, file_hash):
+    with connect() as conn:
+        conn.execute("UPDATE documents SET file_hash = ? WHERE id = ?", (file_hash, document_id))
+    invalidate_metadata()
+
+def get_file_manifest(project_id):
+    """Return {file_name: (size, mtime_ns, content_hash, document_id)}"""
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("SELECT file_name, size, mtime_ns, content_hash, document_id FROM file_manifest WHERE project_id = ?", (project_id,))
+        return {row[0]: row[1:] for row in c.fetchall()}
+
+def update_file_manifest(project_id, file_name, stat, content_hash, document_id):
+    with connect() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO file_manifest (project_id, file_name, size, mtime_ns, content_hash, document_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (project_id, file_name, stat.st_size, stat.st_mtime_ns, content_hash, document_id))
+
+# -- Ingestion jobs --
+# The app asks for a project's jobs on every rerun, but they only change through the functions
+# below (and delete_document), so the listing is memoized until one of them bumps the version.
+_ingestion_version = 0
+_ingestion_cache = {}
+_ingestion_lock = threading.Lock()
+
+def invalidate_ingestion_jobs():
+    global _ingestion_version
+    with _ingestion_lock:
+        _ingestion_version += 1
+        _ingestion_cache.clear()
+
+def enqueue_ingestion(project_id, document_id):
+    """Queue a document for the background ingestion worker"""
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO ingestion_jobs (project_id, document_id) VALUES (?, ?)", (project_id, document_id))
+        job_id = c.lastrowid
+    invalidate_ingestion_jobs()
+    return job_id
+
+def claim_next_ingestion_job():
+    """Atomically mark the oldest queued job as running; returns (job_id, project_id, document_id) or None"""
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, project_id, document_id FROM ingestion_jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+        job = c.fetchone()
+        if job is None:
+            return None
+        c.execute("""
+            UPDATE ingestion_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'queued'
+        """, (job[0],))
+        claimed = c.rowcount == 1
+    if not claimed:
+        return None  # another worker got there first
+    invalidate_ingestion_jobs()
+    return job
+
+def update_ingestion_job(job_id, **fields):
+    """Update status / pages_done / page_count / chunks_done / error of a job"""
+    columns = ', '.join(f"{name} = ?" for name in fields)
+    with connect() as conn:
+        conn.execute(
+            f"UPDATE ingestion_jobs SET {columns}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (*fields.values(), job_id)
+        )
+    invalidate_ingestion_jobs()
+
+def requeue_stale_ingestion_jobs(stale_minutes=10):
+    """Put jobs whose worker stopped reporting (e.g. the server restarted) back in the queue"""
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE ingestion_jobs SET status = 'queued'
+            WHERE status = 'running' AND updated_at < datetime('now', ?)
+        """, (f"-{stale_minutes} minutes",))
+        requeued = c.rowcount
+    if requeued:
+        invalidate_ingestion_jobs()
+    return requeued
+
+def get_ingestion_jobs(project_id, include_finished=False):
+    key = (project_id, include_finished)
+    with _ingestion_lock:
+        version = _ingestion_version
+        jobs = _ingestion_cache.get(key)
+    if jobs is None:
+        jobs = query_ingestion_jobs(project_id, include_finished)
+        with _ingestion_lock:
+            # a job update that landed while we were reading makes this result stale
+            if _ingestion_version == version:
+                _ingestion_cache[key] = jobs
+    return list(jobs)
+
+def has_active_ingestion_jobs(project_id):
+    return any(job[2] in ('queued', 'running') for job in get_ingestion_jobs(project_id))
+
+def query_ingestion_jobs(project_id, include_finished=False):
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT j.id, d.file_name, j.status, j.pages_done, j.page_count, j.chunks_done, j.error
+            FROM ingestion_jobs j
+            JOIN documents d ON j.document_id = d.id
+            WHERE j.project_id = ? {"" if include_finished else "AND j.status IN ('queued', 'running', 'failed')"}
+            ORDER BY j.id
+        """, (project_id,))
+        return c.fetchall()
 
 if __name__ == "__main__":
     # Example usage
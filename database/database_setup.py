@@ -14,7 +14,9 @@ def create_connection(db_file="database/projects.db"):
         print(f"Connection error: {e}")
         return None
 
-def setup_database(conn, sql_file="db_setup.sql"):
+SCHEMA_FILE = Path(__file__).with_name("db_setup.sql")
+
+def setup_database(conn, sql_file=SCHEMA_FILE):
     """Execute SQL from external file"""
     try:
         sql_script = Path(sql_file).read_text()
@@ -19,13 +19,66 @@ CREATE TABLE IF NOT EXISTS text_chunks (
     id INTEGER PRIMARY KEY,
     document_id INTEGER NOT NULL,
     text TEXT NOT NULL,
-    page_number INTEGER,
+    page_number INTEGER,  -- First page the chunk covers
+    end_page INTEGER,  -- Last page the chunk covers
+    start_char INTEGER,  -- Offsets into the document's extracted text
+    end_char INTEGER,
     chunk_index INTEGER NOT NULL,  -- Order in document
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     vector BLOB NOT NULL,
     FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL,
+    document_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued / running / done / failed
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    page_count INTEGER,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+);
+
+-- Full-text index over chunk text (BM25), mirrored from text_chunks by the triggers below
+CREATE VIRTUAL TABLE IF NOT EXISTS text_chunks_fts USING fts5(
+    text,
+    content='text_chunks',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS text_chunks_fts_insert AFTER INSERT ON text_chunks BEGIN
+    INSERT INTO text_chunks_fts (rowid, text) VALUES (new.id, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS text_chunks_fts_delete AFTER DELETE ON text_chunks BEGIN
+    INSERT INTO text_chunks_fts (text_chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS text_chunks_fts_update AFTER UPDATE OF text ON text_chunks BEGIN
+    INSERT INTO text_chunks_fts (text_chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO text_chunks_fts (rowid, text) VALUES (new.id, new.text);
+END;
+
+-- What the last projects-directory scan saw, so unchanged files are skipped without hashing
+CREATE TABLE IF NOT EXISTS file_manifest (
+    project_id INTEGER NOT NULL,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,  -- SHA256 of the file bytes
+    document_id INTEGER,
+    PRIMARY KEY (project_id, file_name),
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+);
+
 -- Indexes for faster queries
-CREATE INDEX idx_project_docs ON documents(project_id);
-CREATE INDEX idx_doc_chunks ON text_chunks(document_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_project_docs ON documents(project_id);
+CREATE INDEX IF NOT EXISTS idx_doc_chunks ON text_chunks(document_id);
+CREATE INDEX IF NOT EXISTS idx_job_status ON ingestion_jobs(status);
\ No newline at end of file
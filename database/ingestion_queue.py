@@ -0,0 +1,74 @@
+import threading
+import time
+import traceback
+
+from database import database_manager
+
+
+class IngestionWorker(threading.Thread):
+    """Daemon thread that drains the ingestion_jobs table one document at a time.
+
+    Uploads only enqueue a job, so the UI stays responsive while pages are
+    parsed, OCR'd and embedded here; progress is written back to the job row.
+    """
+
+    def __init__(self, poll_interval=1.0, progress_interval=1.0):
+        super().__init__(name='ingestion-worker', daemon=True)
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        requeued = database_manager.requeue_stale_ingestion_jobs(stale_minutes=0)
+        if requeued:
+            print(f"Requeued {requeued} interrupted ingestion jobs")
+        while not self._stop_event.is_set():
+            job = database_manager.claim_next_ingestion_job()
+            if job is None:
+                self._stop_event.wait(self.poll_interval)
+                continue
+            self.run_job(*job)
+
+    def run_job(self, job_id, project_id, document_id):
+        last_report = [0.0]
+        pages = {}
+
+        def progress(pages_done, page_count, chunks_done):
+            pages.update(pages_done=pages_done, page_count=page_count)
+            # throttle writes; the status panel only polls every couple of seconds
+            now = time.monotonic()
+            if now - last_report[0] >= self.progress_interval:
+                last_report[0] = now
+                database_manager.update_ingestion_job(
+                    job_id, pages_done=pages_done, page_count=page_count, chunks_done=chunks_done
+                )
+
+        try:
+            # a retried job must not duplicate the chunks of an earlier, interrupted attempt
+            database_manager.delete_document_chunks(document_id)
+            chunks = database_manager.parse_insert_document(project_id, document_id, progress=progress)
+        except Exception as e:
+            traceback.print_exc()
+            database_manager.update_ingestion_job(job_id, status='failed', error=str(e))
+            return
+        if chunks is None:
+            database_manager.update_ingestion_job(job_id, status='failed', error="File not found")
+            return
+        database_manager.update_ingestion_job(job_id, status='done', chunks_done=chunks, error=None, **pages)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """Start the process-wide ingestion worker once; later calls return the running one"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = IngestionWorker()
+            _worker.start()
+        return _worker
@@ -0,0 +1,91 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+LLM_CACHE_DB = 'database/llm_cache.db'
+
+
+class LLMResponseCache:
+    """Disk-backed cache of model responses keyed by model name and prompt hash.
+
+    Entries expire after `ttl` seconds, the least recently used ones are evicted
+    past `max_entries`, and entries tagged with a project are dropped as soon as
+    that project's chunks change.
+    """
+
+    def __init__(self, db_path=LLM_CACHE_DB, ttl=7 * 24 * 3600, max_entries=2000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                project_id INTEGER,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_project ON llm_cache(project_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model, prompt):
+        return hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, model, prompt):
+        key = self.key(model, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._conn.commit()
+        return row[0] if row is not None else None
+
+    def put(self, model, prompt, response, project_id=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO llm_cache (key, model, project_id, response, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (self.key(model, prompt), model, project_id, response, now, now))
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def invalidate_project(self, project_id):
+        """Forget every response generated from this project's documents"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE project_id = ?", (project_id,))
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,129 @@
+import re
+from statistics import median
+
+from database.context_builder import CHARS_PER_TOKEN, estimate_tokens, sentence_spans
+
+# span flag PyMuPDF sets on bold text
+BOLD_FLAG = 16
+HEADING_MAX_CHARS = 120
+HEADING_SIZE_RATIO = 1.15
+
+
+def page_blocks(page):
+    """[(text, is_heading)] for a page's text blocks, in reading order.
+
+    A block counts as a heading when it is short, does not end like a sentence and
+    is set noticeably larger than the page's body text, or entirely in bold.
+    """
+    blocks = [block for block in page.get_text("dict")["blocks"] if block.get("type") == 0]
+    sizes = [span["size"] for block in blocks for line in block["lines"] for span in line["spans"]
+             for _ in range(len(span["text"].strip()))]
+    body_size = median(sizes) if sizes else 0
+
+    result = []
+    for block in blocks:
+        lines = [''.join(span["text"] for span in line["spans"]).strip() for line in block["lines"]]
+        text = join_lines([line for line in lines if line])
+        if not text:
+            continue
+        spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        largest = max(span["size"] for span in spans)
+        bold = all(span["flags"] & BOLD_FLAG for span in spans)
+        is_heading = (
+            len(text) <= HEADING_MAX_CHARS
+            and not text.endswith(('.', ',', ';', ':'))
+            and (largest >= body_size * HEADING_SIZE_RATIO or bold)
+        )
+        result.append((text, is_heading))
+    return result
+
+
+def text_blocks(text):
+    """[(text, False)] per paragraph of plain text, e.g. OCR output without layout information"""
+    paragraphs = re.split(r'\n\s*\n', text)
+    return [(joined, False) for joined in (join_lines(p.splitlines()) for p in paragraphs) if joined]
+
+
+def join_lines(lines):
+    """Join a block's lines, undoing end-of-line hyphenation"""
+    text = ''
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if text.endswith('-') and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return text
+
+
+def chunk_blocks(pages, target_tokens=350, overlap_tokens=50):
+    """Group a stream of (page_number, [(text, is_heading)]) into chunks of about target_tokens.
+
+    Chunks end at sentence boundaries and a heading always starts a new chunk. Within a
+    section, consecutive chunks share up to overlap_tokens of trailing sentences. Yields
+    dicts with text, start_page, end_page and start_char / end_char offsets into the
+    document's extracted text (blocks joined by newlines, in page order).
+    """
+    current = []  # (text, page, start, end, tokens, is_heading)
+    current_tokens = 0
+    offset = 0
+
+    def emit(parts):
+        return {
+            'text': ' '.join(part[0] for part in parts),
+            'start_page': parts[0][1],
+            'end_page': parts[-1][1],
+            'start_char': parts[0][2],
+            'end_char': parts[-1][3],
+        }
+
+    for page_number, blocks in pages:
+        for text, is_heading in blocks:
+            if is_heading:
+                # consecutive headings (chapter, then section) stay together in front of the text that follows
+                if not all(part[5] for part in current):
+                    yield emit(current)
+                    current, current_tokens = [], 0
+                segments = [(0, len(text))]
+            else:
+                segments = sentence_spans(text)
+
+            for start, end in segments:
+                for piece_start, piece_end in split_long(text, start, end, target_tokens):
+                    piece = text[piece_start:piece_end]
+                    tokens = estimate_tokens(piece)
+                    # a heading stays with the text that follows it instead of becoming a chunk of its own
+                    if current_tokens + tokens > target_tokens and not all(part[5] for part in current):
+                        yield emit(current)
+                        # carry a proper suffix of the chunk into the next one, so no chunk repeats another
+                        # whole; the heading sits at the front and is therefore never carried
+                        carried, carried_tokens = [], 0
+                        for part in reversed(current[1:]):
+                            if carried_tokens + part[4] > min(overlap_tokens, target_tokens - tokens):
+                                break
+                            carried.insert(0, part)
+                            carried_tokens += part[4]
+                        current, current_tokens = carried, carried_tokens
+                    current.append((piece, page_number, offset + piece_start, offset + piece_end, tokens, is_heading))
+                    current_tokens += tokens
+            offset += len(text) + 1
+    # a trailing heading with no text under it is not worth a chunk of its own
+    if not all(part[5] for part in current):
+        yield emit(current)
+
+
+def split_long(text, start, end, target_tokens):
+    """Split a sentence longer than a whole chunk at word boundaries"""
+    max_chars = target_tokens * CHARS_PER_TOKEN
+    while end - start > max_chars:
+        cut = text.rfind(' ', start, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        yield start, cut
+        start = cut
+        while start < end and text[start] == ' ':
+            start += 1
+    if start < end:
+        yield start, end
@@ -0,0 +1,139 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+EMBEDDING_CACHE_DB = 'database/embedding_cache.db'
+
+
+class EmbeddingCache:
+    """Content-addressed store of embeddings keyed by (model, task type, SHA-256 of the text).
+
+    Shared by every document and project, so identical chunks are only ever embedded once.
+    """
+
+    def __init__(self, db_path=EMBEDDING_CACHE_DB):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, task_type, text_hash)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model, task_type, texts):
+        """Return {text_hash: vector} for every text already in the cache"""
+        hashes = list({self.text_hash(text) for text in texts})
+        found = {}
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._conn.execute(f"""
+                    SELECT text_hash, vector FROM embedding_cache
+                    WHERE model = ? AND task_type = ? AND text_hash IN ({','.join('?' * len(part))})
+                """, [model, task_type or '', *part]).fetchall()
+                found.update((text_hash, np.frombuffer(blob, dtype=np.float32)) for text_hash, blob in rows)
+            for text in texts:
+                if self.text_hash(text) in found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(self, model, task_type, texts, vectors):
+        rows = [
+            (model, task_type or '', self.text_hash(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO embedding_cache (model, task_type, text_hash, vector)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryEmbeddingCache:
+    """Size-bounded in-process LRU of query embeddings, optionally backed by an EmbeddingCache.
+
+    Keys are (model, normalized text) so reruns of the same question or topic skip the API.
+    """
+
+    def __init__(self, max_entries=1024, persistent=None, task_type="RETRIEVAL_QUERY"):
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self.task_type = task_type
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.split()).casefold()
+
+    def get(self, text, model):
+        key = (model, self.normalize(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+        if self.persistent is not None:
+            vector = self.persistent.get_many(model, self.task_type, [key[1]]).get(EmbeddingCache.text_hash(key[1]))
+            if vector is not None:
+                self._remember(key, vector)
+                with self._lock:
+                    self.hits += 1
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, model, vector):
+        key = (model, self.normalize(text))
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self.persistent is not None:
+            self.persistent.put_many(model, self.task_type, [key[1]], [vector])
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+        }
@@ -0,0 +1,163 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import google.generativeai as genai
+
+
+class EmbeddingError(Exception):
+    """Raised when a batch still fails after every retry"""
+
+
+class RateLimited(Exception):
+    """Provider asked us to slow down; retry_after is in seconds when the provider sent one"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def genai_transport(model, texts, task_type=None):
+    """Embed a list of texts with the google.generativeai SDK"""
+    kwargs = {'task_type': task_type} if task_type else {}
+    return genai.embed_content(model=model, content=texts, **kwargs)['embedding']
+
+
+class HTTPTransport:
+    """Embed through the REST batchEmbedContents endpoint, e.g. a local fake server in tests"""
+
+    def __init__(self, base_url="https://generativelanguage.googleapis.com/v1beta", api_key=None, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def __call__(self, model, texts, task_type=None):
+        requests = []
+        for text in texts:
+            request = {'model': model, 'content': {'parts': [{'text': text}]}}
+            if task_type:
+                request['taskType'] = task_type
+            requests.append(request)
+        url = f"{self.base_url}/{model}:batchEmbedContents"
+        if self.api_key:
+            url += f"?key={self.api_key}"
+        http_request = urllib.request.Request(
+            url, data=json.dumps({'requests': requests}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code in (429, 503):
+                retry_after = e.headers.get('Retry-After')
+                raise RateLimited(f"HTTP {e.code}", float(retry_after) if retry_after else None) from e
+            raise
+        return [embedding.get('values') for embedding in body.get('embeddings', [])]
+
+
+class EmbeddingClient:
+    """Batched, concurrent, rate-limited embedding client with retries.
+
+    Texts are split into provider-sized batches that run on a small thread
+    pool. A token bucket keeps us under the per-minute quota, and failed or
+    incomplete batches are retried with exponential backoff. Only the texts
+    that are still missing get retried.
+    """
+
+    def __init__(self, model="models/embedding-001", batch_size=100, max_concurrency=4,
+                 texts_per_minute=1500, max_retries=5, backoff_base=1.0, backoff_max=60.0, transport=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.transport = transport or genai_transport
+        self.bucket = TokenBucket(rate=texts_per_minute / 60.0, capacity=max(batch_size, texts_per_minute / 60.0))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix='embed')
+            return self._executor
+
+    def embed(self, texts, task_type=None, model=None):
+        """Return one vector per text, in order; raises EmbeddingError if a batch keeps failing"""
+        texts = list(texts)
+        if not texts:
+            return []
+        model = model or self.model
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_batch(model, batches[0], task_type)
+        futures = [self._get_executor().submit(self._embed_batch, model, batch, task_type) for batch in batches]
+        return [vector for future in futures for vector in future.result()]
+
+    def _embed_batch(self, model, texts, task_type):
+        vectors = [None] * len(texts)
+        missing = list(range(len(texts)))
+        last_error = None
+        # only attempts that bring back nothing new use up a retry; a partial batch starts the count over
+        failures = 0
+        attempts = 0
+        while True:
+            if failures:
+                self._backoff(failures, last_error)
+            self.bucket.acquire(len(missing))
+            attempts += 1
+            try:
+                result = self.transport(model, [texts[i] for i in missing], task_type)
+            except Exception as e:
+                print(f"Embedding batch of {len(missing)} failed (attempt {attempts}): {e}")
+                last_error = e
+                failures += 1
+            else:
+                # keep whatever came back and retry only the holes
+                before = len(missing)
+                for i, vector in zip(missing, result or []):
+                    if vector:
+                        vectors[i] = vector
+                missing = [i for i in missing if vectors[i] is None]
+                if not missing:
+                    return vectors
+                last_error = EmbeddingError(f"{len(missing)} embeddings missing from response")
+                failures = 0 if len(missing) < before else failures + 1
+            if failures > self.max_retries:
+                raise EmbeddingError(f"Embedding failed for {len(missing)} of {len(texts)} texts after {attempts} attempts: {last_error}")
+
+    def _backoff(self, attempt, error):
+        if isinstance(error, RateLimited) and error.retry_after:
+            delay = error.retry_after
+        else:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        time.sleep(delay * random.uniform(0.8, 1.2))
@@ -0,0 +1,83 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+OCR_CACHE_DB = 'database/ocr_cache.db'
+
+
+class OCRCache:
+    """Persistent, size-bounded LRU cache of Tesseract output keyed by rendered page content.
+
+    Safe to open from several OCR worker processes at once (WAL + busy timeout).
+    """
+
+    def __init__(self, db_path=OCR_CACHE_DB, max_entries=20000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache(last_used)")
+        self._conn.commit()
+
+    def __getstate__(self):
+        # only the location and limits travel to worker processes; each opens its own connection
+        return {'db_path': self.db_path, 'max_entries': self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @staticmethod
+    def key(samples, width, height, dpi, lang=None, config=''):
+        hasher = hashlib.sha256()
+        hasher.update(f"{width}x{height}@{dpi}|{lang}|{config}|".encode('utf-8'))
+        hasher.update(samples)
+        return hasher.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+        return row[0] if row is not None else None
+
+    def put(self, key, text):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO ocr_cache (key, text, last_used) VALUES (?, ?, ?)", (key, text, time.time()))
+            # evict the least recently used pages once over the limit
+            self._conn.execute("""
+                DELETE FROM ocr_cache WHERE key IN (
+                    SELECT key FROM ocr_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }
@@ -2,37 +2,96 @@
 import fitz
 import pytesseract
 from PIL import Image
-import io
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import google.generativeai as genai
 import numpy as np
+from database.pdf_parsing.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from database.pdf_parsing.embedding_client import EmbeddingClient
+from database.pdf_parsing.chunker import chunk_blocks, page_blocks, text_blocks
+from database.context_builder import estimate_tokens
 
 genai.configure(api_key="API_KEY")
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
+# shared by query embedding and document ingestion
+default_embedding_client = EmbeddingClient()
+QUERY_EMBEDDING_MODEL = "models/embedding-001"
+# database_manager attaches the on-disk EmbeddingCache as the persistent tier
+query_embedding_cache = QueryEmbeddingCache()
+
 def retrieve_question_answer(question):
+    question_vector = query_embedding_cache.get(question, QUERY_EMBEDDING_MODEL)
+    if question_vector is not None:
+        return question_vector
     try:
-        response = genai.embed_content(
-            model="models/embedding-001",
-            content=question,
-            task_type="RETRIEVAL_QUERY"
-        )
-        question_vector = response['embedding']
-        print(f"Question vector: {question_vector}")
+        question_vector = np.asarray(default_embedding_client.embed([question], task_type="RETRIEVAL_QUERY", model=QUERY_EMBEDDING_MODEL)[0], dtype=np.float32)
+        query_embedding_cache.put(question, QUERY_EMBEDDING_MODEL, question_vector)
+        print(f"Embedded question: {question[:50]} ({len(question_vector)} dims)")
         return question_vector
     except Exception as e:
         print(f"Error embedding question: {question}")
         print(f"Error message: {e}")
         return None
 
+def open_pdf(source):
+    """Open a PDF from a file path or from raw bytes"""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def ocr_page(page, dpi=300, lang=None, config='', cache=None):
+    """OCR one page, consulting the cache first; returns (text, cache_hit)"""
+    pix = page.get_pixmap(dpi=dpi)
+    key = None
+    if cache is not None:
+        key = cache.key(pix.samples, pix.width, pix.height, dpi, lang, config)
+        text = cache.get(key)
+        if text is not None:
+            return text, True
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    text = pytesseract.image_to_string(img, lang=lang, config=config)
+    if cache is not None:
+        cache.put(key, text)
+    return text, False
+
+# Each OCR worker process opens the document once and renders its own pages,
+# so only page numbers and result strings cross the process boundary.
+_worker_pdf = None
+_worker_ocr_cache = None
+
+def _init_ocr_worker(source, ocr_cache):
+    global _worker_pdf, _worker_ocr_cache
+    _worker_pdf = open_pdf(source)
+    _worker_ocr_cache = ocr_cache
+
+def _ocr_worker_page(page_index, dpi, lang, config):
+    return ocr_page(_worker_pdf[page_index], dpi, lang, config, _worker_ocr_cache)
+
 class PDFParser:
-    def __init__(self):
+    def __init__(self, ocr_workers=None, ocr_dpi=300, ocr_lang=None, ocr_config='', ocr_cache=None,
+                 embedding_model="models/embedding-001", embedding_task_type=None, embedding_cache=None,
+                 embedding_client=None):
         self.parsing_thread = None
+        self.embedding_client = embedding_client or default_embedding_client
+        self.embedding_model = embedding_model
+        self.embedding_task_type = embedding_task_type
+        self.embedding_cache = embedding_cache
+        self._embed_executor = None
+        # ocr_workers <= 1 keeps OCR in-process; None uses every core
+        self.ocr_workers = os.cpu_count() if ocr_workers is None else ocr_workers
+        self.ocr_dpi = ocr_dpi
+        self.ocr_lang = ocr_lang
+        self.ocr_config = ocr_config
+        self.ocr_cache = ocr_cache
         # self.model = genai.TextEmbeddingModel(model_name="models/embedding-001")
         # self.client = genai.Client(api_key='API_KEY')
         self.last_ve = None
         self.last_pdf = None
 
     def parse_pdf(self, uploaded_file):
+        """Parse the whole file into a list of vector entries; see iter_vector_entries for the streaming form"""
         if uploaded_file is None:
             return None
         ve = self.create_vector_entries(uploaded_file)
@@ -40,37 +99,101 @@ class PDFParser:
         # self.last_ve = ve
         return ve
 
-    def chunk_pdf_whole(self, doc, chunk_size=300):
-        word_tuples = []
-        file_bytes = doc.read()
-        if file_bytes:
-            with fitz.open(stream=file_bytes, filetype="pdf") as pdf_doc:
+    def iter_pages(self, doc, on_page=None, structured=False):
+        """Yield (page_number, text) in page order, OCR-ing text-less pages in a process pool.
+
+        With structured=True the text is replaced by the page's [(block_text, is_heading)].
+        on_page(page_number, page_count) is called as each page is handed out."""
+        if isinstance(doc, (str, os.PathLike)):
+            source = os.fspath(doc)
+        elif isinstance(getattr(doc, 'name', None), str) and os.path.exists(doc.name):
+            source = doc.name
+        else:
+            # in-memory uploads only; files on disk are opened by path
+            source = doc.read()
+        if not source:
+            return
+        executor = None
+        pending = deque()  # (page_number, text or Future), in page order
+        in_flight = 0
+        try:
+            with open_pdf(source) as pdf_doc:
+                page_count = len(pdf_doc)
                 for i, page in enumerate(pdf_doc):
                     text = page.get_text()
-                    if not text.strip():
-                        print(f"Page {i + 1}: No text found, applying OCR...")
-                        pix = page.get_pixmap(dpi=300)
-                        img_bytes = pix.tobytes("png")
-                        img = Image.open(io.BytesIO(img_bytes))
-                        text = pytesseract.image_to_string(img)
-                    else:
+                    if text.strip():
                         print(f"Page {i + 1}: Extracted text with get_text()")
+                        pending.append((i + 1, page_blocks(page) if structured else text))
+                    elif self.ocr_workers > 1:
+                        print(f"Page {i + 1}: No text found, queueing OCR...")
+                        if executor is None:
+                            executor = ProcessPoolExecutor(self.ocr_workers, initializer=_init_ocr_worker, initargs=(source, self.ocr_cache))
+                        pending.append((i + 1, executor.submit(_ocr_worker_page, i, self.ocr_dpi, self.ocr_lang, self.ocr_config)))
+                        in_flight += 1
+                    else:
+                        print(f"Page {i + 1}: No text found, applying OCR...")
+                        text = self._record_ocr(ocr_page(page, self.ocr_dpi, self.ocr_lang, self.ocr_config, self.ocr_cache))
+                        pending.append((i + 1, text_blocks(text) if structured else text))
+
+                    # scan ahead while the pool is busy, but never hold more than 2x workers OCR jobs
+                    while pending and (not isinstance(pending[0][1], Future) or pending[0][1].done() or in_flight >= 2 * self.ocr_workers):
+                        page_number, text = pending.popleft()
+                        if isinstance(text, Future):
+                            text = self._record_ocr(text.result())
+                            text = text_blocks(text) if structured else text
+                            in_flight -= 1
+                        if on_page is not None:
+                            on_page(page_number, page_count)
+                        yield page_number, text
+            while pending:
+                page_number, text = pending.popleft()
+                if isinstance(text, Future):
+                    text = self._record_ocr(text.result())
+                    text = text_blocks(text) if structured else text
+                if on_page is not None:
+                    on_page(page_number, page_count)
+                yield page_number, text
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if self.ocr_cache is not None:
+                print(f"OCR cache: {self.ocr_cache.stats()}")
+
+    def _record_ocr(self, result):
+        text, hit = result
+        if self.ocr_cache is not None:
+            self.ocr_cache.record(hit)
+        return text
+
+    def iter_chunks(self, doc, chunk_size=300, on_page=None):
+        """Yield (chunk_text, first_page) as soon as enough words have streamed in"""
+        words = []  # (word, page_number), never much more than chunk_size + one page
+        chunk_count = 0
+        for page_number, text in self.iter_pages(doc, on_page=on_page):
+            page_words = text.split()
+            words.extend((word, page_number) for word in page_words)
+            print(f"Page {page_number}: {len(page_words)} words")
+            while len(words) >= chunk_size:
+                chunk, words = words[:chunk_size], words[chunk_size:]
+                chunk_count += 1
+                print(f"Chunk {chunk_count}: {len(chunk)} words, Page {chunk[0][1]}")
+                yield " ".join(word for word, _ in chunk), chunk[0][1]
+        if words:
+            chunk_count += 1
+            print(f"Chunk {chunk_count}: {len(words)} words, Page {words[0][1]}")
+            yield " ".join(word for word, _ in words), words[0][1]
+
+    def iter_structured_chunks(self, doc, target_tokens=350, overlap_tokens=50, on_page=None):
+        """Yield chunk dicts cut on headings and sentence boundaries; see chunker.chunk_blocks"""
+        chunk_count = 0
+        for chunk in chunk_blocks(self.iter_pages(doc, on_page=on_page, structured=True), target_tokens, overlap_tokens):
+            chunk_count += 1
+            print(f"Chunk {chunk_count}: ~{estimate_tokens(chunk['text'])} tokens, Pages {chunk['start_page']}-{chunk['end_page']}")
+            yield chunk
+
+    def chunk_pdf_whole(self, doc, chunk_size=300):
+        return list(self.iter_chunks(doc, chunk_size))
 
-                    words = text.split()
-                    word_tuples.extend([(word, i + 1) for word in words])
-                    print(f"Page {i + 1}: {len(words)} words")
-
-        chunks = []
-        for i in range(0, len(word_tuples), chunk_size):
-            chunk = word_tuples[i:i + chunk_size]
-            if not chunk:
-                break
-            chunk_text = " ".join(word for word, _ in chunk)
-            first_page = chunk[0][1]
-            print(f"Chunk {len(chunks) + 1}: {len(chunk)} words, Page {first_page}")
-            chunks.append((chunk_text, first_page))
-
-        return chunks
     # def embed_chunk(self, chunk):
     #     response = self.client.models.embed_content(model="gemini-embedding-exp-03-07", contents=chunk, config=types.EmbedContentConfig(
     #           task_type="RETRIEVAL_DOCUMENT",
@@ -79,30 +202,73 @@ class PDFParser:
     #     return response.embeddings[0].values
 
     def embed_chunk(self, chunk):
-        """Embeds text using the Gemini embedding model"""
-        try:
-            response = genai.embed_content(
-                model="models/embedding-001",
-                content=chunk
-            )
-            return response['embedding']
-        except Exception as e:
-            print(f"Error embedding text: {e}")
-            return None
+        """Embeds a list of texts using the Gemini embedding model; raises EmbeddingError once retries run out"""
+        return self.embedding_client.embed(chunk, task_type=self.embedding_task_type, model=self.embedding_model)
 
-    def create_vector_entries(self, pdf_document):
-        chunks = self.chunk_pdf_whole(pdf_document, chunk_size=1600)
-        vector_entries = []
-        i = 0
-        tries = 0
-        text_chunks = [chunk[0] for chunk in chunks]
-        pages = [chunk[1] for chunk in chunks]
-        embeddings = self.embed_chunk(text_chunks)
-        for i in range(len(chunks)):
-            vector_entry = {'text': text_chunks[i], 'page': pages[i], 'vector': np.array(embeddings[i]), 'chunk_index': i}
-            vector_entries.append(vector_entry)
-            print(vector_entry)
-        return vector_entries
+    def iter_vector_entries(self, pdf_document, chunk_size=1600, batch_size=32, on_page=None,
+                            structured=True, target_tokens=350, overlap_tokens=50, in_flight=None):
+        """Yield lists of up to batch_size vector entries, embedding chunks as the pages stream in.
 
+        Up to in_flight batches (default: the client's max_concurrency) are embedded concurrently
+        while pages keep being parsed and earlier batches are stored; batches come out in order.
+        structured=True uses the heading/sentence-aware chunker (target_tokens, overlap_tokens);
+        structured=False falls back to fixed windows of chunk_size words."""
+        if structured:
+            chunks = (
+                {'text': chunk['text'], 'page': chunk['start_page'], 'end_page': chunk['end_page'],
+                 'start_char': chunk['start_char'], 'end_char': chunk['end_char']}
+                for chunk in self.iter_structured_chunks(pdf_document, target_tokens, overlap_tokens, on_page=on_page)
+            )
+        else:
+            chunks = (
+                {'text': text, 'page': page}
+                for text, page in self.iter_chunks(pdf_document, chunk_size=chunk_size, on_page=on_page)
+            )
+        in_flight = in_flight or self.embedding_client.max_concurrency
+        executor = self._get_embed_executor()
+        pending = deque()
+        batch = []
+        try:
+            for chunk_index, entry in enumerate(chunks):
+                entry['chunk_index'] = chunk_index
+                batch.append(entry)
+                if len(batch) == batch_size:
+                    pending.append(executor.submit(self.embed_entries, batch))
+                    batch = []
+                    while len(pending) >= in_flight:
+                        yield pending.popleft().result()
+            if batch:
+                pending.append(executor.submit(self.embed_entries, batch))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # the consumer stopped early or a batch failed; do not embed what nobody will store
+            for future in pending:
+                future.cancel()
+        if self.embedding_cache is not None:
+            print(f"Embedding cache: {self.embedding_cache.stats()}")
+
+    def _get_embed_executor(self):
+        if self._embed_executor is None:
+            self._embed_executor = ThreadPoolExecutor(self.embedding_client.max_concurrency, thread_name_prefix='embed-batch')
+        return self._embed_executor
 
+    def embed_entries(self, entries):
+        """Attach a 'vector' to every entry, only calling the API for texts the cache has not seen"""
+        texts = [entry['text'] for entry in entries]
+        hash_of = EmbeddingCache.text_hash
+        cached = {}
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get_many(self.embedding_model, self.embedding_task_type, texts)
+        missing = list({hash_of(text): text for text in texts if hash_of(text) not in cached}.values())
+        if missing:
+            embeddings = self.embed_chunk(missing)
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(self.embedding_model, self.embedding_task_type, missing, embeddings)
+            cached.update((hash_of(text), embedding) for text, embedding in zip(missing, embeddings))
+        for entry in entries:
+            entry['vector'] = np.array(cached[hash_of(entry['text'])], dtype=np.float32)
+        return entries
 
+    def create_vector_entries(self, pdf_document):
+        return [entry for batch in self.iter_vector_entries(pdf_document) for entry in batch]
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+class QuantizedIndex:
+    """Two-stage search over int8 rows with a per-row scale.
+
+    Queries first scan the int8 codes for the top_k * oversample closest rows,
+    then rescore only those rows exactly against the float32 matrix. Both are
+    normally memory-mapped from the project's vector store, so a scan touches a
+    quarter of the bytes an exact one does.
+    """
+
+    def __init__(self, chunk_ids, codes, scales, matrix, oversample=4, block_rows=256):
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        self.codes = codes
+        self.scales = scales
+        self.matrix = matrix
+        self.oversample = oversample
+        self.block_rows = block_rows
+        self.size = len(self.chunk_ids)
+        self.dim = codes.shape[1] if codes.ndim == 2 else 0
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def coarse_scores(self, query):
+        """Approximate similarity of every row, widened to float32 one cache-sized block at a time"""
+        scores = np.empty(self.size, dtype=np.float32)
+        buffer = np.empty((min(self.block_rows, self.size), self.dim), dtype=np.float32)
+        for start in range(0, self.size, self.block_rows):
+            codes = self.codes[start:start + self.block_rows]
+            block = buffer[:len(codes)]
+            np.copyto(block, codes, casting='unsafe')
+            np.dot(block, query, out=scores[start:start + len(codes)])
+        scores *= self.scales
+        return scores
+
+    def search(self, query_vector, top_k=5, oversample=None):
+        """Return (similarity, chunk_id) pairs; similarities are exact float32 scores"""
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if self.size == 0 or norm == 0 or top_k <= 0:
+            return []
+        query = query / norm
+        scores = self.coarse_scores(query)
+        n = min(self.size, top_k * (oversample or self.oversample))
+        candidates = np.sort(np.argpartition(-scores, n - 1)[:n])  # sorted rows keep memory-mapped reads sequential
+        exact = np.asarray(self.matrix[candidates]) @ query
+        k = min(top_k, n)
+        top = np.argpartition(-exact, k - 1)[:k]
+        top = top[np.argsort(-exact[top])]
+        return [(float(exact[i]), int(self.chunk_ids[candidates[i]])) for i in top]
+
+
+def quantize(matrix, block_rows=8192):
+    """Return (int8 codes, float32 per-row scales) for a float32 matrix"""
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    scales = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+        scale = np.abs(block).max(axis=1) / 127.0 if block.size else np.zeros(len(block), dtype=np.float32)
+        scale[scale == 0] = 1.0
+        codes[start:start + len(block)] = np.rint(block / scale[:, None])
+        scales[start:start + len(block)] = scale
+    return codes, scales
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import threading
+import fitz
+
+THUMBNAIL_DIR = 'database/thumbnails'
+
+
+class ThumbnailCache:
+    """On-disk cache of rendered PDF pages as PNG, keyed by document hash, page and zoom.
+
+    Only the requested pages are rasterized, all from a single open of the file.
+    """
+
+    def __init__(self, directory=THUMBNAIL_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._page_counts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def file_key(pdf_path):
+        """Fallback key for files without a stored content hash"""
+        stat = os.stat(pdf_path)
+        return hashlib.sha256(f"{os.path.abspath(pdf_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+
+    def path(self, doc_hash, page_number, zoom):
+        # fan out on the hash prefix so no single directory grows huge
+        return os.path.join(self.directory, doc_hash[:2], f"{doc_hash}_p{page_number}_z{zoom:g}.png")
+
+    def page_count(self, pdf_path, doc_hash=None):
+        doc_hash = doc_hash or self.file_key(pdf_path)
+        with self._lock:
+            count = self._page_counts.get(doc_hash)
+        if count is None:
+            with fitz.open(pdf_path) as doc:
+                count = len(doc)
+            with self._lock:
+                self._page_counts[doc_hash] = count
+        return count
+
+    def get_pages(self, pdf_path, page_numbers, zoom=1.0, doc_hash=None):
+        """Return [(page_number, png_bytes)] for the given zero-based pages, rendering only the misses"""
+        doc_hash = doc_hash or self.file_key(pdf_path)
+        images = {}
+        missing = []
+        for page_number in page_numbers:
+            try:
+                with open(self.path(doc_hash, page_number, zoom), 'rb') as f:
+                    images[page_number] = f.read()
+            except FileNotFoundError:
+                missing.append(page_number)
+        with self._lock:
+            self.hits += len(images)
+            self.misses += len(missing)
+
+        if missing:
+            with fitz.open(pdf_path) as doc:
+                matrix = fitz.Matrix(zoom, zoom)
+                for page_number in missing:
+                    png = doc[page_number].get_pixmap(matrix=matrix, alpha=False).tobytes("png")
+                    self._write(self.path(doc_hash, page_number, zoom), png)
+                    images[page_number] = png
+        return [(page_number, images[page_number]) for page_number in page_numbers]
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,100 @@
+import threading
+import numpy as np
+
+
+class VectorIndex:
+    """In-memory, pre-normalized float32 embedding matrix for a single project"""
+
+    def __init__(self, dim=None, capacity=64):
+        self.dim = dim
+        self.size = 0
+        self._lock = threading.Lock()
+        self._capacity = capacity
+        self._matrix = np.empty((capacity, dim or 0), dtype=np.float32)
+        self._chunk_ids = np.empty(capacity, dtype=np.int64)
+        self._document_ids = np.empty(capacity, dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, chunk_ids, document_ids, matrix):
+        """Wrap already-normalized arrays (e.g. memory-mapped ones) without copying them"""
+        index = cls(dim=matrix.shape[1], capacity=0)
+        index._matrix = matrix
+        index._chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        index._document_ids = np.asarray(document_ids, dtype=np.int64)
+        index.size = index._capacity = len(index._chunk_ids)
+        return index
+
+    @property
+    def matrix(self):
+        return self._matrix[:self.size]
+
+    @property
+    def chunk_ids(self):
+        return self._chunk_ids[:self.size]
+
+    @property
+    def document_ids(self):
+        return self._document_ids[:self.size]
+
+    def _grow(self, needed):
+        capacity = max(self._capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self._matrix[:self.size]
+        chunk_ids = np.empty(capacity, dtype=np.int64)
+        chunk_ids[:self.size] = self._chunk_ids[:self.size]
+        document_ids = np.empty(capacity, dtype=np.int64)
+        document_ids[:self.size] = self._document_ids[:self.size]
+        self._matrix, self._chunk_ids, self._document_ids = matrix, chunk_ids, document_ids
+        self._capacity = capacity
+
+    def add(self, chunk_ids, document_ids, vectors):
+        """Append rows to the index, normalizing the vectors once on the way in"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(chunk_ids), -1))
+        with self._lock:
+            if self.dim is None or self.size == 0:
+                self.dim = vectors.shape[1]
+                if self._matrix.shape[1] != self.dim:
+                    self._matrix = np.empty((self._capacity, self.dim), dtype=np.float32)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            end = self.size + len(chunk_ids)
+            if end > self._capacity:
+                self._grow(end)
+            self._matrix[self.size:end] = vectors
+            self._chunk_ids[self.size:end] = chunk_ids
+            self._document_ids[self.size:end] = document_ids
+            self.size = end
+
+    def remove_document(self, document_id):
+        """Drop every row that belongs to the given document"""
+        with self._lock:
+            keep = self.document_ids != document_id
+            if keep.all():
+                return
+            self._matrix = self.matrix[keep]
+            self._chunk_ids = self.chunk_ids[keep]
+            self._document_ids = self.document_ids[keep]
+            self.size = self._capacity = len(self._chunk_ids)
+
+    def search(self, query_vector, top_k=5):
+        """Return (similarity, chunk_id) pairs for the top_k most similar rows"""
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        with self._lock:
+            if self.size == 0 or norm == 0 or top_k <= 0:
+                return []
+            scores = self.matrix @ (query / norm)
+            chunk_ids = self.chunk_ids.copy()
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(chunk_ids[i])) for i in top]
+
+
+def normalize_rows(vectors):
+    """L2-normalize each row, leaving all-zero rows untouched"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
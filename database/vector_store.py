@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import numpy as np
+from database.vector_index import VectorIndex, normalize_rows
+from database.quantized_index import QuantizedIndex, quantize
+
+
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+
+
+def store_lock(directory):
+    """One lock per index directory, shared by every MmapVectorStore opened on it"""
+    key = os.path.abspath(directory)
+    with _store_locks_lock:
+        lock = _store_locks.get(key)
+        if lock is None:
+            lock = _store_locks[key] = threading.RLock()
+        return lock
+
+
+class MmapVectorStore:
+    """Append-only, memory-mapped embedding file for one project.
+
+    Layout of the index directory:
+        vectors.f32  - normalized float32 rows, back to back
+        vectors.i8   - the same rows quantized to int8, scanned by QuantizedIndex
+        scales.f32   - float32 scale of each int8 row
+        ids.i64      - (chunk_id, document_id) int64 pair per row
+        deleted.i64  - (document_id, row_count) tombstones, compacted away on the next load
+        meta.json    - vector dimension
+
+    Row i of every vector file belongs to row i of ids.i64. Writers and the compacting load()
+    hold a per-directory lock, so the ingestion worker never appends while a search compacts.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, 'vectors.f32')
+        self.codes_path = os.path.join(directory, 'vectors.i8')
+        self.scales_path = os.path.join(directory, 'scales.f32')
+        self.ids_path = os.path.join(directory, 'ids.i64')
+        self.deleted_path = os.path.join(directory, 'deleted.i64')
+        self.meta_path = os.path.join(directory, 'meta.json')
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def dim(self):
+        with open(self.meta_path) as f:
+            return json.load(f)['dim']
+
+    @property
+    def lock(self):
+        return store_lock(self.directory)
+
+    def append(self, chunk_ids, document_ids, vectors):
+        """Append rows; vectors are normalized before they hit the disk"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(chunk_ids), -1))
+        with self.lock:
+            self._append(chunk_ids, document_ids, vectors)
+
+    def _append(self, chunk_ids, document_ids, vectors):
+        dim = self.dim()
+        if dim == 0:
+            # store was compacted down to nothing; adopt the dimension of the new rows
+            self._replace(self.meta_path, json.dumps({'dim': vectors.shape[1]}).encode('utf-8'))
+        elif vectors.shape[1] != dim:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match store dimension {dim}")
+        ids = np.column_stack([chunk_ids, document_ids]).astype(np.int64)
+        codes, scales = quantize(vectors)
+        self._truncate_to_ids(vectors.shape[1])
+        # ids last: a failed write leaves an unreferenced tail, which the next append cuts off
+        with open(self.vectors_path, 'ab') as f:
+            f.write(vectors.tobytes())
+        with open(self.codes_path, 'ab') as f:
+            f.write(codes.tobytes())
+        with open(self.scales_path, 'ab') as f:
+            f.write(scales.tobytes())
+        with open(self.ids_path, 'ab') as f:
+            f.write(ids.tobytes())
+
+    def _truncate_to_ids(self, dim):
+        """Cut every file back to the last complete ids row, so new rows line up across files again"""
+        rows = os.path.getsize(self.ids_path) // 16 if os.path.exists(self.ids_path) else 0
+        for path, row_bytes in ((self.ids_path, 16), (self.vectors_path, 4 * dim),
+                                (self.codes_path, dim), (self.scales_path, 4)):
+            if os.path.exists(path) and os.path.getsize(path) > rows * row_bytes:
+                print(f"Dropping unreferenced rows at the end of {path}")
+                os.truncate(path, rows * row_bytes)
+
+    def remove_document(self, document_id):
+        """Tombstone the document's rows written so far; rows appended later under the same id survive"""
+        with self.lock:
+            rows = os.path.getsize(self.ids_path) // 16 if os.path.exists(self.ids_path) else 0
+            with open(self.deleted_path, 'ab') as f:
+                f.write(np.array([document_id, rows], dtype=np.int64).tobytes())
+
+    def rebuild(self, chunk_ids, document_ids, vectors):
+        """Replace the whole store with the given rows"""
+        os.makedirs(self.directory, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1] if vectors.ndim == 2 and len(vectors) else 0
+        vectors = normalize_rows(vectors.reshape(len(chunk_ids), dim))
+        ids = np.column_stack([chunk_ids, document_ids]).astype(np.int64).reshape(-1, 2)
+        with self.lock:
+            self._replace(self.vectors_path, vectors.tobytes())
+            self._write_quantized(vectors)
+            self._replace(self.ids_path, ids.tobytes())
+            self._replace(self.meta_path, json.dumps({'dim': dim}).encode('utf-8'))
+            if os.path.exists(self.deleted_path):
+                os.remove(self.deleted_path)
+
+    def _write_quantized(self, vectors):
+        codes, scales = quantize(vectors)
+        self._replace(self.codes_path, codes.tobytes())
+        self._replace(self.scales_path, scales.tobytes())
+
+    def _replace(self, path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self):
+        """Map the store into a VectorIndex without reading the vectors into memory"""
+        with self.lock:
+            return self._load()
+
+    def _load(self):
+        if not self.exists():
+            return None
+        dim = self.dim()
+        id_rows = os.path.getsize(self.ids_path) // 16 if os.path.exists(self.ids_path) else 0
+        # whole rows only: a failed append can leave half an ids row behind
+        ids = np.fromfile(self.ids_path, dtype=np.int64, count=2 * id_rows).reshape(-1, 2) if id_rows else np.empty((0, 2), dtype=np.int64)
+        vector_rows = os.path.getsize(self.vectors_path) // (4 * dim) if dim and os.path.exists(self.vectors_path) else 0
+        rows = min(len(ids), vector_rows)
+        ids = ids[:rows]
+        if rows == 0:
+            return VectorIndex.from_arrays(ids[:, 0], ids[:, 1], np.empty((0, dim), dtype=np.float32))
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, dim))
+
+        if os.path.exists(self.deleted_path):
+            deleted = np.fromfile(self.deleted_path, dtype=np.int64).reshape(-1, 2)
+            keep = np.ones(rows, dtype=bool)
+            for document_id, row_count in deleted:
+                keep[:row_count] &= ids[:row_count, 1] != document_id
+            chunk_ids, document_ids, vectors = ids[keep, 0], ids[keep, 1], matrix[keep]
+            del matrix
+            try:
+                self.rebuild(chunk_ids, document_ids, vectors)
+            except OSError as e:
+                # e.g. the old file is still mapped by another reader on Windows
+                print(f"Could not compact vector store {self.directory}: {e}")
+                return VectorIndex.from_arrays(chunk_ids, document_ids, np.ascontiguousarray(vectors))
+            return self._load()
+
+        return VectorIndex.from_arrays(ids[:, 0], ids[:, 1], matrix)
+
+    def load_quantized(self, index):
+        """Map the int8 rows of an index returned by load(); stores written before they existed get them now.
+
+        Returns None when the index is not mapped from this store (e.g. compaction failed), since its rows
+        would not line up with the files.
+        """
+        if index.size == 0 or getattr(index.matrix, 'filename', None) != os.path.abspath(self.vectors_path):
+            return None
+        with self.lock:
+            return self._load_quantized(index)
+
+    def _load_quantized(self, index):
+        dim = index.dim
+        code_rows = os.path.getsize(self.codes_path) // dim if os.path.exists(self.codes_path) else 0
+        scale_rows = os.path.getsize(self.scales_path) // 4 if os.path.exists(self.scales_path) else 0
+        if min(code_rows, scale_rows) < index.size:
+            print(f"Quantizing vector store {self.directory}")
+            try:
+                self._write_quantized(index.matrix)
+            except OSError as e:
+                print(f"Could not write quantized vectors for {self.directory}: {e}")
+                return None
+        codes = np.memmap(self.codes_path, dtype=np.int8, mode='r', shape=(index.size, dim))
+        scales = np.memmap(self.scales_path, dtype=np.float32, mode='r', shape=(index.size,))
+        return QuantizedIndex(index.chunk_ids, codes, scales, index.matrix)
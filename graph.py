@@ -1,12 +1,26 @@
 import streamlit as st
 import networkx as nx
 import matplotlib.pyplot as plt
+import hashlib
+import io
 import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import streamlit.components.v1 as components
 import pdf_handler
 import re
-from client import model  
+import client
+from database import database_manager
 
-def initialize_mindmap(base_context, json_save_path):
+# vis-network front end (same look as mindmap.html); focusing and browsing happen in the browser
+_mindmap_component = components.declare_component(
+    "mindmap", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "mindmap_component")
+)
+
+def initialize_mindmap(base_context, json_save_path, project_id=None, regenerate=False, topic=None, source_fingerprint=None):
     """Initialize mind map based on the selected PDF using Gemini"""
     # if not st.session_state.get('selected_pdf'):
     #     st.error("Please select a PDF first.")
@@ -40,58 +54,210 @@ def initialize_mindmap(base_context, json_save_path):
             }}
         ]
     }}
-    Include 5-7 main nodes and 2-3 subnodes for each.
+    Include one root node for the topic and 5-7 main nodes connected to it.
+    Do not add subnodes; each main node is expanded on demand later.
     Make the structure hierarchical and meaningful.
     Ensure all node labels are unique and don't contain special characters.
     """
 
     try:
         # Generate mind map structure using Gemini
-        response = model.generate_content(prompt)
-        json_str = re.search(r'\{.*\}', response.text, re.DOTALL).group()
+        response_text = client.generate_text(prompt, project_id=project_id, regenerate=regenerate)
+        json_str = re.search(r'\{.*\}', response_text, re.DOTALL).group()
         graph_data = json.loads(json_str)
+        graph_data.update(
+            topic=topic,
+            generated_at=datetime.now().isoformat(timespec='seconds'),
+            source_fingerprint=source_fingerprint
+        )
         # Save the generated JSON to a file
         with open(json_save_path, 'w') as f:
             json.dump(graph_data, f, indent=4)
 
-        # Create networkx graph
-        G = nx.DiGraph()
+        G = build_mindmap_graph(graph_data)
+        set_mindmap(G, topic=topic, json_path=json_save_path, project_id=project_id)
+        prefetch_children(G, st.session_state.mindmap['root'], project_id)
+        return G
 
-        # Add nodes with attributes
-        for node in graph_data['nodes']:
-            label = node['label'].strip()
-            G.add_node(
-                label,
-                size=node.get('size', 1) * 1500,
-                color=node.get('color', '#6a9df6'),
-                description=node.get('description', 'No description available')
+    except Exception as e:
+        st.error(f"Mind map creation failed: {str(e)}")
+        return None
+
+def build_mindmap_graph(graph_data):
+    """Build the networkx graph from the model's (or a saved) JSON structure"""
+    G = nx.DiGraph()
+
+    # Add nodes with attributes
+    labels = {}
+    for node in graph_data['nodes']:
+        label = node['label'].strip()
+        labels[node['id']] = label
+        G.add_node(
+            label,
+            size=node.get('size', 1) * 1500,
+            color=node.get('color', '#6a9df6'),
+            description=node.get('description', 'No description available')
+        )
+
+    # Add edges with relationships
+    for edge in graph_data['edges']:
+        source = labels.get(edge['source'])
+        target = labels.get(edge['target'])
+        if source in G and target in G:
+            G.add_edge(source, target, relation=edge.get('relation', 'related'))
+
+    # leaves can be expanded on demand unless an earlier expansion found nothing to add
+    for node in graph_data['nodes']:
+        label = labels[node['id']]
+        G.nodes[label]['expanded'] = node.get('expanded', G.out_degree(label) > 0)
+
+    G.graph.update({key: graph_data.get(key) for key in ('topic', 'generated_at', 'source_fingerprint')})
+    return G
+
+def save_mindmap(G, json_path):
+    """Write the (possibly expanded) graph back in the same JSON shape the model produced"""
+    graph_data = {
+        'nodes': [
+            {
+                'id': node,
+                'label': node,
+                'size': data.get('size', 1500) / 1500,
+                'color': data.get('color', '#6a9df6'),
+                'description': data.get('description', 'No description available'),
+                'expanded': data.get('expanded', True)
+            }
+            for node, data in G.nodes(data=True)
+        ],
+        'edges': [
+            {'source': u, 'target': v, 'relation': data.get('relation', 'related')}
+            for u, v, data in G.edges(data=True)
+        ],
+        **G.graph
+    }
+    tmp_path = f"{json_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(graph_data, f, indent=4)
+    os.replace(tmp_path, json_path)
+
+def set_mindmap(G, topic=None, json_path=None, project_id=None):
+    """Make G the mind map shown in this session"""
+    # Use the first node label as the root if the original topic is not found
+    root_node = list(G.nodes())[0]
+
+    st.session_state.mindmap = {
+        'graph': G,
+        'root': root_node,
+        'initial_root': root_node,
+        'current_focus': root_node,
+        'visible_nodes': set(G.nodes()),
+        'selected_node': None,
+        'history': [],
+        'topic': topic,
+        'json_path': json_path,
+        'project_id': project_id
+    }
+
+def load_mindmap(json_path, project_id=None):
+    """Restore a previously generated mind map from its JSON file, without calling the model"""
+    with open(json_path) as f:
+        graph_data = json.load(f)
+    G = build_mindmap_graph(graph_data)
+    set_mindmap(G, topic=graph_data.get('topic'), json_path=json_path, project_id=project_id)
+    if project_id is not None:
+        prefetch_children(G, st.session_state.mindmap['root'], project_id)
+    return G
+
+# -- On-demand expansion --
+# The first generation only produces the top-level concepts; a node's children are generated
+# the first time it is focused, from a RAG lookup scoped to that node.
+
+EXPANSION_CACHE_SIZE = 512
+PREFETCH_LIMIT = 3
+# (project_id, topic, label, project fingerprint) -> Future of the node's children
+_expansions = OrderedDict()
+_expansion_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='mindmap-expand')
+
+def generate_children(topic, label, description, project_id):
+    """Ask the model for one node's children; safe to run off the Streamlit thread"""
+    context, _ = database_manager.get_RAG_mind_map_branch_context(topic, label, project_id)
+    prompt = context + f"""
+
+    The node "{label}" is described as: {description}
+    Return 2-4 sub-concepts of this node as JSON:
+    {{
+        "children": [
+            {{
+                "label": "Sub Concept",
+                "description": "Detailed explanation...",
+                "relation": "contains"
+            }}
+        ]
+    }}
+    Use "contains", "related" or "influences" as the relation.
+    Ensure labels are short, unique and don't contain special characters.
+    """
+    response_text = client.generate_text(prompt, project_id=project_id)
+    children = json.loads(re.search(r'\{.*\}', response_text, re.DOTALL).group()).get('children', [])
+    return [child for child in children if isinstance(child, dict) and str(child.get('label', '')).strip()]
+
+def request_expansion(G, node, project_id):
+    """Future with the node's children; repeated and concurrent requests share one generation"""
+    key = (project_id, G.graph.get('topic'), node, database_manager.get_project_fingerprint(project_id))
+    with _cache_lock:
+        future = _expansions.get(key)
+        if future is None or (future.done() and future.exception() is not None):
+            future = _expansion_executor.submit(
+                generate_children, G.graph.get('topic') or node, node,
+                G.nodes[node].get('description', ''), project_id
             )
+            _expansions[key] = future
+        _expansions.move_to_end(key)
+        while len(_expansions) > EXPANSION_CACHE_SIZE:
+            _expansions.popitem(last=False)
+    return future
 
-        # Add edges with relationships
-        for edge in graph_data['edges']:
-            source = next(n['label'].strip() for n in graph_data['nodes'] if n['id'] == edge['source'])
-            target = next(n['label'].strip() for n in graph_data['nodes'] if n['id'] == edge['target'])
-            if source in G and target in G:
-                G.add_edge(source, target, relation=edge.get('relation', 'related'))
-
-        # Use the first node label as the root if the original topic is not found
-        root_node = list(G.nodes())[0] 
-
-        st.session_state.mindmap = {
-            'graph': G,
-            'root': root_node,
-            'initial_root': root_node,
-            'current_focus': root_node,
-            'visible_nodes': set(G.nodes()),
-            'selected_node': None,
-            'history': []
-        }
+def prefetch_children(G, node, project_id):
+    """Start generating the first few collapsed children of node, the likeliest next clicks"""
+    if project_id is None or node not in G:
+        return
+    collapsed = [child for child in G.successors(node) if not G.nodes[child].get('expanded', True)]
+    for child in collapsed[:PREFETCH_LIMIT]:
+        request_expansion(G, child, project_id)
 
-        return G
+def merge_children(G, node, children):
+    for child in children:
+        label = str(child['label']).strip()
+        if label not in G:
+            G.add_node(
+                label,
+                size=child.get('size', 1) * 1500,
+                color=child.get('color', '#a5d8ff'),
+                description=child.get('description', 'No description available'),
+                expanded=False
+            )
+        if label != node and not G.has_edge(node, label):
+            G.add_edge(node, label, relation=child.get('relation', 'contains'))
+    G.nodes[node]['expanded'] = True
 
+def expand_node(node):
+    """Generate and merge the children of a collapsed node of the session's mind map; True if it changed"""
+    mindmap = st.session_state.mindmap
+    G = mindmap['graph']
+    project_id = mindmap.get('project_id')
+    if project_id is None or node not in G or G.nodes[node].get('expanded', True):
+        return False
+    try:
+        with st.spinner(f"Expanding {node}..."):
+            children = request_expansion(G, node, project_id).result()
     except Exception as e:
-        st.error(f"Mind map creation failed: {str(e)}")
-        return None
+        # shown by the draw functions, which rerun the app right after an expansion attempt
+        mindmap['expand_error'] = f"Could not expand {node}: {str(e)}"
+        return False
+    merge_children(G, node, children)
+    if mindmap.get('json_path'):
+        save_mindmap(G, mindmap['json_path'])
+    prefetch_children(G, node, project_id)
+    return True
 
 def get_subgraph(G, root_node):
     """Get subgraph starting from root_node with safety checks"""
@@ -115,41 +281,89 @@ def get_subgraph(G, root_node):
     return G.subgraph(nodes)
 
 
-def draw_interactive_mindmap():
-    """Draw interactive mind map with navigation using Streamlit components"""
-    if 'mindmap' not in st.session_state or not st.session_state.mindmap['graph']:
-        return
+EDGE_STYLES = {
+    'contains': {'style': 'dashed', 'width': 2, 'color': '#6c757d'},
+    'related': {'style': 'solid', 'width': 1.5, 'color': '#495057'},
+    'influences': {'style': 'solid', 'width': 2, 'color': '#2b8a3e', 'alpha': 0.8}
+}
 
-    G = st.session_state.mindmap['graph']
-    current_root = st.session_state.mindmap['current_focus']
-    
-    # Create subgraph based on current focus with safety checks
-    try:
-        subG = get_subgraph(G, current_root)
-    except:
-        subG = G
-    
-    # Create figure
-    fig, ax = plt.subplots(figsize=(12, 8), facecolor='#f8f9fa')
-    
-    # Compute layout
-    if subG.number_of_nodes() > 0:
-        pos = nx.spring_layout(subG, k=1.5, iterations=100, seed=42)
+# (graph hash, focus) -> positions and (graph hash, focus, selected) -> PNG, shared by all sessions
+LAYOUT_CACHE_SIZE = 256
+FIGURE_CACHE_SIZE = 64
+_layout_cache = OrderedDict()
+_figure_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cache_get(cache, key):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+def _cache_put(cache, key, value, max_entries):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+
+def graph_hash(G):
+    """Stable content hash of the mind map's nodes, edges and their drawing attributes"""
+    hasher = hashlib.sha256()
+    for node in sorted(G.nodes()):
+        data = G.nodes[node]
+        # expanded is drawn too: an expansion that adds no children still turns the node into a leaf
+        hasher.update(f"n|{node}|{data.get('size')}|{data.get('color')}|{data.get('expanded', True)}\n".encode('utf-8'))
+    for u, v in sorted(G.edges()):
+        hasher.update(f"e|{u}|{v}|{G.edges[u, v].get('relation')}\n".encode('utf-8'))
+    return hasher.hexdigest()
+
+def get_layout(G, subG, focus, G_hash=None):
+    """Positions for subG, cached per (graph, focus).
+
+    The whole graph is laid out once; each focus view warm-starts from those
+    positions and only needs a few relaxation steps.
+    """
+    G_hash = G_hash or graph_hash(G)
+    pos = _cache_get(_layout_cache, (G_hash, focus))
+    if pos is not None:
+        return pos
+    full_pos = _cache_get(_layout_cache, (G_hash, None))
+    if full_pos is None:
+        full_pos = nx.spring_layout(G, k=1.5, iterations=100, seed=42) if G.number_of_nodes() else {}
+        _cache_put(_layout_cache, (G_hash, None), full_pos, LAYOUT_CACHE_SIZE)
+    if subG.number_of_nodes() == G.number_of_nodes():
+        pos = full_pos
+    elif subG.number_of_nodes() > 0:
+        pos = nx.spring_layout(subG, k=1.5, pos={n: full_pos[n] for n in subG.nodes()}, iterations=20, seed=42)
     else:
         pos = {}
+    _cache_put(_layout_cache, (G_hash, focus), pos, LAYOUT_CACHE_SIZE)
+    return pos
 
-    # Draw edges
-    edge_styles = {
-        'contains': {'style': 'dashed', 'width': 2, 'color': '#6c757d'},
-        'related': {'style': 'solid', 'width': 1.5, 'color': '#495057'},
-        'influences': {'style': 'solid', 'width': 2, 'color': '#2b8a3e', 'alpha': 0.8}
-    }
-    
+def render_mindmap_png(G, subG, current_root, selected_node, G_hash=None):
+    """Render the focused view to PNG bytes, reusing earlier renders of the same view"""
+    G_hash = G_hash or graph_hash(G)
+    key = (G_hash, current_root, selected_node)
+    png = _cache_get(_figure_cache, key)
+    if png is not None:
+        return png
+
+    # Create figure
+    fig, ax = plt.subplots(figsize=(12, 8), facecolor='#f8f9fa')
+    pos = get_layout(G, subG, current_root, G_hash)
+
+    # Draw edges, one call per relation style
+    edge_groups = {}
     for u, v, data in subG.edges(data=True):
         relation = data.get('relation', 'related')
-        style = edge_styles.get(relation, edge_styles['related'])
+        edge_groups.setdefault(relation if relation in EDGE_STYLES else 'related', []).append((u, v))
+
+    for relation, edgelist in edge_groups.items():
+        style = EDGE_STYLES[relation]
         nx.draw_networkx_edges(
-            subG, pos, edgelist=[(u, v)],
+            subG, pos, edgelist=edgelist,
             width=style['width'],
             style=style['style'],
             edge_color=style['color'],
@@ -159,20 +373,20 @@ def draw_interactive_mindmap():
             arrowstyle='-|>',
             arrowsize=15
         )
-    
+
     # Draw nodes
     node_colors = []
     node_sizes = []
     for node in subG.nodes():
-        if node == st.session_state.mindmap.get('selected_node'):
+        if node == selected_node:
             node_colors.append('#ff9f1c')  # Selected
         elif node == current_root:
             node_colors.append('#2b8a3e')  # Current focus
         else:
             node_colors.append(subG.nodes[node].get('color', '#4dabf7'))  # Default
-        
+
         node_sizes.append(subG.nodes[node].get('size', 1500))
-    
+
     if subG.number_of_nodes() > 0:
         nx.draw_networkx_nodes(
             subG, pos, ax=ax,
@@ -182,7 +396,7 @@ def draw_interactive_mindmap():
             linewidths=1,
             alpha=0.9
         )
-        
+
         # Draw labels
         nx.draw_networkx_labels(
             subG, pos, ax=ax,
@@ -193,8 +407,79 @@ def draw_interactive_mindmap():
             bbox=dict(facecolor='white', edgecolor='none', alpha=0.7, boxstyle='round,pad=0.3')
         )
 
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', facecolor=fig.get_facecolor(), bbox_inches='tight')
+    plt.close(fig)
+    png = buffer.getvalue()
+    _cache_put(_figure_cache, key, png, FIGURE_CACHE_SIZE)
+    return png
+
+def graph_to_json(G):
+    """Nodes and edges in the shape the vis-network component expects"""
+    return {
+        'nodes': [
+            {
+                'id': node,
+                'label': node,
+                'size': data.get('size', 1500),
+                'color': data.get('color', '#6a9df6'),
+                'description': data.get('description', 'No description available'),
+                'expandable': not data.get('expanded', True)
+            }
+            for node, data in G.nodes(data=True)
+        ],
+        'edges': [
+            {'source': u, 'target': v, 'relation': data.get('relation', 'related')}
+            for u, v, data in G.edges(data=True)
+        ]
+    }
+
+def draw_client_mindmap(height=600, key="mindmap"):
+    """Render the mind map with vis-network in the browser; navigation does not rerun the app"""
+    if 'mindmap' not in st.session_state or not st.session_state.mindmap['graph']:
+        return None
+
+    G = st.session_state.mindmap['graph']
+    if st.session_state.mindmap.get('expand_error'):
+        st.error(st.session_state.mindmap.pop('expand_error'))
+    event = _mindmap_component(
+        graph=graph_to_json(G),
+        graph_hash=graph_hash(G),
+        root=st.session_state.mindmap['initial_root'],
+        # lets the browser put back the "➕" of a node whose expansion did not change the graph
+        failed_nonce=st.session_state.mindmap.get('expand_failed'),
+        height=height,
+        key=key,
+        default=None
+    )
+    # the browser only calls back when a collapsed node is focused; the value sticks across reruns
+    if event and event.get('nonce') != st.session_state.mindmap.get('expand_nonce'):
+        st.session_state.mindmap['expand_nonce'] = event.get('nonce')
+        if event.get('action') == 'expand':
+            if not expand_node(event.get('node')):
+                st.session_state.mindmap['expand_failed'] = event.get('nonce')
+            st.rerun()
+    return event
+
+def draw_interactive_mindmap():
+    """Draw interactive mind map with navigation using Streamlit components"""
+    if 'mindmap' not in st.session_state or not st.session_state.mindmap['graph']:
+        return
+
+    G = st.session_state.mindmap['graph']
+    current_root = st.session_state.mindmap['current_focus']
+    if st.session_state.mindmap.get('expand_error'):
+        st.error(st.session_state.mindmap.pop('expand_error'))
+
+    # Create subgraph based on current focus with safety checks
+    try:
+        subG = get_subgraph(G, current_root)
+    except:
+        subG = G
+
     # Display the figure
-    st.pyplot(fig, use_container_width=True)
+    png = render_mindmap_png(G, subG, current_root, st.session_state.mindmap.get('selected_node'))
+    st.image(png, use_container_width=True)
 
     # Node information and navigation using Streamlit components
     col1, col2 = st.columns([3, 1])
@@ -229,6 +514,7 @@ def draw_interactive_mindmap():
             st.session_state.mindmap['history'].append(st.session_state.mindmap['current_focus'])
             st.session_state.mindmap['current_focus'] = selected
             st.session_state.mindmap['selected_node'] = selected
+            expand_node(selected)
             st.rerun()
 
 def navigate_up():
@@ -0,0 +1,74 @@
+import json
+import os
+
+from database import database_manager
+
+# generated artifacts live next to the project's documents
+ARTIFACT_FOLDERS = {
+    'mindmap': 'mindmaps',
+    'quiz': 'quizzes',
+}
+
+# path -> (mtime_ns, metadata); saved files are small but listed on every rerun
+_metadata_cache = {}
+
+
+def read_metadata(json_path):
+    """topic / generated_at / source_fingerprint of a saved artifact"""
+    mtime_ns = os.stat(json_path).st_mtime_ns
+    cached = _metadata_cache.get(json_path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    with open(json_path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        data = {}  # quizzes saved before metadata was added
+    metadata = {key: data.get(key) for key in ('topic', 'generated_at', 'source_fingerprint')}
+    _metadata_cache[json_path] = (mtime_ns, metadata)
+    return metadata
+
+
+def list_artifacts(project_id, project_path, kind):
+    """Saved mind maps or quizzes of a project, newest first.
+
+    An artifact is stale when the project's documents changed after it was
+    generated, or when it predates fingerprinting.
+    """
+    folder = os.path.join(project_path, ARTIFACT_FOLDERS[kind])
+    if not os.path.isdir(folder):
+        return []
+    fingerprint = database_manager.get_project_fingerprint(project_id)
+    artifacts = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith('.json'):
+                continue
+            try:
+                metadata = read_metadata(entry.path)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable {kind} {entry.path}: {e}")
+                continue
+            artifacts.append({
+                'topic': metadata['topic'] or os.path.splitext(entry.name)[0],
+                'path': entry.path,
+                'generated_at': metadata['generated_at'],
+                'stale': metadata['source_fingerprint'] != fingerprint,
+                'mtime': entry.stat().st_mtime,
+            })
+    return sorted(artifacts, key=lambda artifact: artifact['mtime'], reverse=True)
+
+
+def find_artifact(project_id, project_path, kind, topic):
+    for artifact in list_artifacts(project_id, project_path, kind):
+        if artifact['topic'] == topic:
+            return artifact
+    return None
+
+
+def artifact_label(artifact):
+    label = artifact['topic']
+    if artifact['generated_at']:
+        label += f" ({artifact['generated_at'].replace('T', ' ')})"
+    if artifact['stale']:
+        label += " ⚠️ outdated"
+    return label
@@ -3,6 +3,7 @@ import auth
 import app 
 import time
 from database import database_manager
+from database.ingestion_queue import start_worker
 
 # Session state initialization
 if "logged_in" not in st.session_state:
@@ -21,6 +22,7 @@ def generate_key(prefix):
 # Main routing logic
 def main():
     # database_setup.main()
+    start_worker()
     database_manager.sync_projects_directory()
     app.main_app()
     # if st.session_state.logged_in and st.session_state.page == "login":
@@ -1,38 +1,45 @@
 import json
+import math
 
 import fitz
 import streamlit as st
-from client import model
+import client
 import os
+from datetime import datetime
+from database.thumbnail_cache import ThumbnailCache
+from database.context_builder import truncate_to_tokens
 
-def display_pdf_preview(pdf_path: str):
-    """Displays an enhanced PDF preview from a file path"""
+PREVIEW_PAGES = 3
+PREVIEW_ZOOM = 1.0
+thumbnail_cache = ThumbnailCache()
+
+def display_pdf_preview(pdf_path: str, doc_hash=None, key="pdf_preview"):
+    """Displays a paged PDF preview from a file path, rendering only the visible pages"""
     if not os.path.exists(pdf_path):
         st.warning("The file does not exist.")
         return
 
     try:
-        with fitz.open(pdf_path) as doc:
-            cols = st.columns(1)
-
-            for i, page in enumerate(doc):
-                if i >= 3:
-                    with cols[0]:
-                        st.write(f"... and {len(doc) - 3} more pages")
-                    break
+        page_count = thumbnail_cache.page_count(pdf_path, doc_hash)
+        if page_count == 0:
+            st.info("This PDF has no pages.")
+            return
+        page_sets = math.ceil(page_count / PREVIEW_PAGES)
+        page_set = 1
+        if page_sets > 1:
+            page_set = st.number_input(
+                f"Pages (set of {PREVIEW_PAGES}, {page_count} pages total)",
+                min_value=1, max_value=page_sets, value=1, step=1, key=key
+            )
+        first = (page_set - 1) * PREVIEW_PAGES
+        page_numbers = range(first, min(first + PREVIEW_PAGES, page_count))
 
-                zoom = 1.5
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat, alpha=False)
-                img_data = pix.tobytes("ppm")
-
-                with cols[0]:
-                    st.image(
-                        img_data,
-                        width=600,
-                        caption=f"Page {i + 1} of {len(doc)}",
-                        use_container_width=True
-                    )
+        for i, img_data in thumbnail_cache.get_pages(pdf_path, page_numbers, zoom=PREVIEW_ZOOM, doc_hash=doc_hash):
+            st.image(
+                img_data,
+                caption=f"Page {i + 1} of {page_count}",
+                use_container_width=True
+            )
 
     except Exception as e:
         st.error(f"Failed to display PDF: {str(e)}")
@@ -52,12 +59,11 @@ def extract_text_from_pdf(pdf_file):
         st.error(f"PDF error: {str(e)}")
         return ""
 
-def generate_quiz_questions(pdf_text, num_questions=10, difficulty="Medium"):
-    """Generates quiz questions with strict formatting"""
-    if not pdf_text.strip():
-        return ""
-    
-    prompt = f"""
+# safety cap for callers that pass raw document text; RAG callers already send a budgeted context
+QUIZ_TEXT_TOKENS = 2500
+
+def build_quiz_prompt(pdf_text, num_questions=10, difficulty="Medium"):
+    return f"""
     Generate exactly {num_questions} multiple-choice questions about this text. For each question explain context shortly so that reader may not rely on context, but just on question. 
     Difficulty: {difficulty}
     Format each question exactly like this:
@@ -70,17 +76,30 @@ def generate_quiz_questions(pdf_text, num_questions=10, difficulty="Medium"):
     Correct Answer: [letter]
     
     Text:
-    {pdf_text[:10000]}
+    {truncate_to_tokens(pdf_text, QUIZ_TEXT_TOKENS)}
     """
+
+def generate_quiz_questions(pdf_text, num_questions=10, difficulty="Medium", project_id=None, regenerate=False):
+    """Generates quiz questions with strict formatting"""
+    if not pdf_text.strip():
+        return ""
+    
+    prompt = build_quiz_prompt(pdf_text, num_questions, difficulty)
     
     try:
-        response = model.generate_content(prompt)
-        return response.text if response else ""
+        return client.generate_text(prompt, project_id=project_id, regenerate=regenerate) or ""
     except Exception as e:
         st.error(f"Generation error: {str(e)}")
         return ""
 
-def parse_quiz_questions(quiz_text, quiz_json_path):
+def stream_quiz_questions(pdf_text, num_questions=10, difficulty="Medium", project_id=None, regenerate=False):
+    """Streaming variant of generate_quiz_questions, for showing questions as they are written"""
+    if not pdf_text.strip():
+        return iter(())
+    prompt = build_quiz_prompt(pdf_text, num_questions, difficulty)
+    return client.stream_text(prompt, project_id=project_id, regenerate=regenerate)
+
+def parse_quiz_questions(quiz_text, quiz_json_path, topic=None, source_fingerprint=None):
     """Robust parsing of quiz questions"""
     if not quiz_text.strip():
         return []
@@ -113,6 +132,18 @@ def parse_quiz_questions(quiz_text, quiz_json_path):
 
     # Save questions to JSON file
     with open(quiz_json_path, 'w') as f:
-        json.dump(questions, f, indent=4)
+        json.dump({
+            'topic': topic,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'source_fingerprint': source_fingerprint,
+            'questions': questions
+        }, f, indent=4)
     
-    return questions
\ No newline at end of file
+    return questions
+
+def load_quiz_questions(quiz_json_path):
+    """Read back the questions saved by parse_quiz_questions"""
+    with open(quiz_json_path) as f:
+        data = json.load(f)
+    # quizzes saved before the metadata was added are a bare list
+    return data if isinstance(data, list) else data.get('questions', [])
\ No newline at end of file
@@ -0,0 +1,93 @@
+from database.context_builder import estimate_tokens
+from database.pdf_parsing.chunker import chunk_blocks, join_lines, text_blocks
+
+
+def sentences(prefix, n):
+    return " ".join(f"{prefix} sentence number {i} talks about cells and tissues." for i in range(n))
+
+
+PAGES = [
+    (1, [("Chapter 1 Cells", True), (sentences("First", 12), False)]),
+    (2, [(sentences("Second", 12), False), ("Chapter 2 Tissues", True), (sentences("Third", 6), False)]),
+]
+
+
+def extracted_text(pages):
+    """The stream chunk offsets point into: blocks joined by newlines, in page order"""
+    return "\n".join(text for _, blocks in pages for text, _ in blocks)
+
+
+def normalized(text):
+    return " ".join(text.split())
+
+
+def test_offsets_and_pages_point_at_the_chunk_text():
+    stream = extracted_text(PAGES)
+    page_of = {}
+    offset = 0
+    for page_number, blocks in PAGES:
+        for text, _ in blocks:
+            for i in range(offset, offset + len(text) + 1):
+                page_of[i] = page_number
+            offset += len(text) + 1
+    chunks = list(chunk_blocks(PAGES, target_tokens=60, overlap_tokens=15))
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert normalized(stream[chunk['start_char']:chunk['end_char']]) == normalized(chunk['text'])
+        assert chunk['start_page'] == page_of[chunk['start_char']]
+        assert chunk['end_page'] == page_of[chunk['end_char'] - 1]
+    assert any(chunk['start_page'] == 1 and chunk['end_page'] == 2 for chunk in chunks)
+
+
+def test_headings_start_chunks_and_never_stand_alone():
+    chunks = list(chunk_blocks(PAGES, target_tokens=60, overlap_tokens=15))
+    starts = [chunk for chunk in chunks if chunk['text'].startswith("Chapter")]
+    assert [chunk['text'].split(" ", 2)[:2] for chunk in starts] == [["Chapter", "1"], ["Chapter", "2"]]
+    assert all(chunk['text'] not in ("Chapter 1 Cells", "Chapter 2 Tissues") for chunk in chunks)
+    # nothing before a heading is carried over into its section
+    second = chunks.index(starts[1])
+    assert chunks[second]['start_char'] >= chunks[second - 1]['end_char']
+
+
+def test_overlap_is_a_bounded_proper_suffix():
+    target, overlap = 60, 15
+    chunks = list(chunk_blocks(PAGES, target_tokens=target, overlap_tokens=overlap))
+    stream = extracted_text(PAGES)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk['start_char'] > previous['start_char']
+        assert chunk['end_char'] > previous['end_char']
+        if chunk['start_char'] < previous['end_char']:
+            assert estimate_tokens(stream[chunk['start_char']:previous['end_char']]) <= overlap
+    for chunk in chunks:
+        assert estimate_tokens(chunk['text']) <= target + estimate_tokens("Chapter 2 Tissues") + 1
+
+
+def test_short_chunk_is_not_repeated_in_full():
+    pages = [(1, [("Intro", True), ("A" * 30 + ". " + "B" * 30 + ". " + "C" * 500 + ".", False)])]
+    chunks = list(chunk_blocks(pages, target_tokens=50, overlap_tokens=20))
+    assert (chunks[0]['start_char'], chunks[0]['end_char']) == (0, 69)
+    assert chunks[1]['start_char'] > chunks[0]['start_char']
+    assert all(estimate_tokens(chunk['text']) <= 50 for chunk in chunks[1:])
+
+
+def test_join_lines_undoes_hyphenation():
+    assert join_lines(["The mito-", "chondria make", "ATP-", "Synthase"]) == "The mitochondria make ATP- Synthase"
+
+
+def test_text_blocks_split_paragraphs():
+    assert text_blocks("first line\nsecond line\n\n  \nnext para-\ngraph\n") == [
+        ("first line second line", False),
+        ("next paragraph", False),
+    ]
+
+
+def test_consecutive_headings_stay_with_the_following_text():
+    pages = [
+        (1, [("Chapter 1 Cells", True), ("1.1 Introduction", True), (sentences("First", 3), False)]),
+        (2, [(sentences("Second", 2), False), ("Appendix", True)]),
+    ]
+    chunks = list(chunk_blocks(pages, target_tokens=200, overlap_tokens=20))
+    assert len(chunks) == 1
+    assert chunks[0]['text'].startswith("Chapter 1 Cells 1.1 Introduction First sentence")
+    assert (chunks[0]['start_page'], chunks[0]['end_page']) == (1, 2)
+    assert "Appendix" not in chunks[0]['text']
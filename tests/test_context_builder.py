@@ -0,0 +1,21 @@
+from database.context_builder import assemble_context, estimate_tokens
+
+
+def test_stop_words_do_not_make_sentences_relevant():
+    chunks = [
+        (0.9, 1, 1, "The Krebs cycle runs in the mitochondria. It releases carbon dioxide.", 4),
+        (0.8, 2, 1, "Chlorophyll is green. Leaves absorb red and blue light.", 9),
+    ]
+    context = assemble_context("What is the Krebs cycle?", chunks)
+    assert "Krebs cycle runs" in context
+    assert "Chlorophyll" not in context
+
+
+def test_page_prefixes_and_separators_fit_the_budget():
+    chunks = [
+        (0.9 - i / 10, i, 1, f"Cells divide by mitosis in stage {i}. Mitosis has phases.", 100 + i)
+        for i in range(6)
+    ]
+    for budget in range(5, 80):
+        context = assemble_context("mitosis stages", chunks, token_budget=budget)
+        assert estimate_tokens(context) <= budget
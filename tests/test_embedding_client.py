@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from benchmarks.fake_embedding_server import fake_vector, serve
+from database.pdf_parsing.embedding_client import EmbeddingClient, EmbeddingError, HTTPTransport
+
+DIM = 16
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**kwargs):
+        server, stats = serve(dim=DIM, latency=0.0, **kwargs)
+        servers.append(server)
+        return HTTPTransport(f"http://127.0.0.1:{server.server_address[1]}/v1beta"), stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def make_client(transport, **kwargs):
+    return EmbeddingClient(transport=transport, batch_size=20, max_concurrency=4, texts_per_minute=600000,
+                           backoff_base=0.01, backoff_max=0.05, **kwargs)
+
+
+def test_flaky_server_returns_every_vector_in_order(fake_server):
+    transport, stats = fake_server(fail_rate=0.3, drop_rate=0.1)
+    texts = [f"chunk {i}" for i in range(150)]
+    for _ in range(5):
+        # at a 30% 429 rate a batch's last text fails ~1 in 3 attempts; leave room so the test never flakes
+        vectors = make_client(transport, max_retries=15).embed(texts)
+        assert len(vectors) == len(texts)
+        for text, vector in zip(texts, vectors):
+            np.testing.assert_allclose(vector, fake_vector(text, DIM), rtol=1e-6)
+    assert stats['requests'] > 5 * 8  # failures and drops were actually retried
+
+
+def test_partial_responses_do_not_use_up_retries():
+    calls = []
+
+    def half_transport(model, texts, task_type=None):
+        """Only ever returns the first half of what was asked for"""
+        calls.append(len(texts))
+        keep = (len(texts) + 1) // 2
+        return [fake_vector(text, DIM) if i < keep else [] for i, text in enumerate(texts)]
+
+    texts = [f"chunk {i}" for i in range(20)]
+    # every response is partial, so without any retries the batch would fail if progress counted as one
+    vectors = make_client(half_transport, max_retries=0).embed(texts)
+    assert vectors == [fake_vector(text, DIM) for text in texts]
+    assert calls == [20, 10, 5, 2, 1]
+
+
+def test_persistent_failure_raises(fake_server):
+    transport, stats = fake_server(fail_rate=1.0)
+    with pytest.raises(EmbeddingError):
+        make_client(transport, max_retries=2).embed(["a", "b"])
+    assert stats['requests'] == 3
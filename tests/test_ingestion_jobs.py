@@ -0,0 +1,29 @@
+import pytest
+from database import database_manager
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(database_manager, 'DB_NAME', str(tmp_path / "projects.db"))
+    database_manager.invalidate_ingestion_jobs()
+    return database_manager.insert_project("P", str(tmp_path))
+
+
+def test_job_listing_is_memoized_until_a_job_changes(project, monkeypatch):
+    document_id = database_manager.insert_document(project, "a.pdf", "hash-a")
+    assert not database_manager.has_active_ingestion_jobs(project)
+    job_id = database_manager.enqueue_ingestion(project, document_id)
+    assert database_manager.has_active_ingestion_jobs(project)
+
+    queries = []
+    query = database_manager.query_ingestion_jobs
+    monkeypatch.setattr(database_manager, 'query_ingestion_jobs', lambda *args: queries.append(args) or query(*args))
+    for _ in range(3):
+        assert [job[2] for job in database_manager.get_ingestion_jobs(project)] == ['queued']
+    assert queries == []
+
+    database_manager.claim_next_ingestion_job()
+    assert [job[2] for job in database_manager.get_ingestion_jobs(project)] == ['running']
+    database_manager.update_ingestion_job(job_id, status='done')
+    assert not database_manager.has_active_ingestion_jobs(project)
+    assert len(queries) == 2
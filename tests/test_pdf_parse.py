@@ -0,0 +1,51 @@
+import threading
+import time
+import fitz
+import numpy as np
+from benchmarks.fake_embedding_server import fake_vector
+from database.pdf_parsing.embedding_client import EmbeddingClient
+from database.pdf_parsing.pdf_parse import PDFParser
+
+DIM = 8
+
+
+def make_pdf(path, pages=6):
+    document = fitz.open()
+    for page_number in range(pages):
+        page = document.new_page()
+        text = " ".join(f"Page {page_number} sentence {i} is about cell biology." for i in range(40))
+        page.insert_textbox(fitz.Rect(72, 72, 540, 780), text, fontsize=9)
+    document.save(path)
+    return path
+
+
+class SlowTransport:
+    """Records how many embedding requests overlap"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, model, texts, task_type=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        return [fake_vector(text, DIM) for text in texts]
+
+
+def test_vector_batches_are_embedded_concurrently_and_yielded_in_order(tmp_path):
+    transport = SlowTransport()
+    client = EmbeddingClient(transport=transport, max_concurrency=4, texts_per_minute=600000)
+    parser = PDFParser(ocr_workers=0, embedding_client=client)
+    batches = list(parser.iter_vector_entries(make_pdf(str(tmp_path / "notes.pdf")), batch_size=2, target_tokens=80))
+    entries = [entry for batch in batches for entry in batch]
+    assert len(batches) > 4
+    assert transport.max_active > 1
+    assert [entry['chunk_index'] for entry in entries] == list(range(len(entries)))
+    for entry in entries:
+        np.testing.assert_allclose(entry['vector'], fake_vector(entry['text'], DIM), rtol=1e-6)
@@ -0,0 +1,133 @@
+import os
+import threading
+import numpy as np
+import pytest
+from database.vector_index import normalize_rows
+from database.vector_store import MmapVectorStore
+
+DIM = 8
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MmapVectorStore(str(tmp_path / "index"))
+
+
+def test_missing_store_loads_as_none(store):
+    assert not store.exists()
+    assert store.load() is None
+
+
+def test_rebuild_load_round_trip(store):
+    rows = vectors(5)
+    store.rebuild([10, 11, 12, 13, 14], [1, 1, 2, 2, 2], rows)
+    index = store.load()
+    assert list(index.chunk_ids) == [10, 11, 12, 13, 14]
+    assert list(index.document_ids) == [1, 1, 2, 2, 2]
+    np.testing.assert_allclose(index.matrix, normalize_rows(rows), rtol=1e-6)
+    assert isinstance(index.matrix, np.memmap)
+
+
+def test_append_extends_the_store(store):
+    first, second = vectors(3, seed=1), vectors(2, seed=2)
+    store.rebuild([1, 2, 3], [1, 1, 1], first)
+    store.append([4, 5], [2, 2], second)
+    index = store.load()
+    assert list(index.chunk_ids) == [1, 2, 3, 4, 5]
+    np.testing.assert_allclose(index.matrix, normalize_rows(np.vstack([first, second])), rtol=1e-6)
+
+
+def test_append_rejects_other_dimensions(store):
+    store.rebuild([1], [1], vectors(1))
+    with pytest.raises(ValueError):
+        store.append([2], [1], np.ones((1, DIM + 1), dtype=np.float32))
+
+
+def test_remove_document_is_compacted_on_load(store):
+    rows = vectors(4)
+    store.rebuild([1, 2, 3, 4], [1, 2, 1, 2], rows)
+    store.remove_document(1)
+    index = store.load()
+    assert list(index.chunk_ids) == [2, 4]
+    np.testing.assert_allclose(index.matrix, normalize_rows(rows[[1, 3]]), rtol=1e-6)
+    # compaction rewrote the files and dropped the tombstones
+    assert not os.path.exists(store.deleted_path)
+    assert list(store.load().chunk_ids) == [2, 4]
+
+
+def test_rows_appended_after_a_tombstone_survive(store):
+    store.rebuild([1, 2], [7, 8], vectors(2))
+    store.remove_document(7)
+    # document id 7 is reused before the next load
+    store.append([3], [7], vectors(1, seed=3))
+    assert list(store.load().chunk_ids) == [2, 3]
+
+
+def test_store_compacted_to_nothing_adopts_new_dimension(store):
+    store.rebuild([1], [1], vectors(1))
+    store.remove_document(1)
+    assert store.load().size == 0
+    store.append([2], [2], np.ones((1, 3), dtype=np.float32))
+    index = store.load()
+    assert list(index.chunk_ids) == [2]
+    assert index.matrix.shape == (1, 3)
+
+
+def test_int8_rows_follow_appends_and_compaction(store):
+    rows = vectors(6)
+    store.rebuild([1, 2, 3], [1, 1, 2], rows[:3])
+    store.append([4, 5, 6], [2, 3, 3], rows[3:])
+    store.remove_document(2)
+    index = store.load()
+    quantized = store.load_quantized(index)
+    assert quantized.size == index.size == 4
+    np.testing.assert_allclose(quantized.codes * quantized.scales[:, None], index.matrix, atol=0.01)
+    hits = quantized.search(rows[4], top_k=1)
+    assert hits[0][1] == 5
+    np.testing.assert_allclose(hits[0][0], 1.0, rtol=1e-5)
+
+
+def test_append_after_a_failed_write_stays_aligned(store):
+    rows = vectors(5)
+    store.rebuild([1, 2, 3, 4], [1, 1, 1, 1], rows[:4])
+    # an append that died after writing its vector but before its ids
+    with open(store.vectors_path, 'ab') as f:
+        f.write(normalize_rows(vectors(1, seed=9)).tobytes())
+    with open(store.ids_path, 'ab') as f:
+        f.write(np.int64(99).tobytes())  # half an ids row
+    store.append([5], [2], rows[4:])
+    index = store.load()
+    assert list(index.chunk_ids) == [1, 2, 3, 4, 5]
+    np.testing.assert_allclose(index.matrix, normalize_rows(rows), rtol=1e-6)
+    assert store.load_quantized(index).search(rows[4], top_k=1)[0][1] == 5
+
+
+def test_appends_and_compaction_from_several_threads(store):
+    store.rebuild([0], [0], vectors(1))
+    errors = []
+
+    def writer(offset):
+        try:
+            for i in range(20):
+                chunk_id = offset + i
+                store.append([chunk_id], [chunk_id % 3], vectors(1, seed=chunk_id))
+                if i % 5 == 0:
+                    store.remove_document(0)
+                    store.load()
+        except Exception as e:  # surfaced below; pytest does not see thread exceptions
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(offset,)) for offset in (100, 200, 300)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    index = store.load()
+    for chunk_id, document_id, row in zip(index.chunk_ids, index.document_ids, index.matrix):
+        assert document_id == chunk_id % 3
+        np.testing.assert_allclose(row, normalize_rows(vectors(1, seed=int(chunk_id)))[0], rtol=1e-5)